@@ -1,30 +1,211 @@
 from flask import Flask, Response, request, render_template
 import cv2
 import os
-import numpy as np
 import threading
 import time
 import json
+import atexit
+import asyncio
 from mqtt_service import MQTTService
 from redis_service import RedisService
+from async_mqtt_service import AsyncMQTTService
+from async_redis_service import AsyncRedisService
 from app_enum import StatusDoor
 from facenet_service import FaceNetService
+from face_gallery import FaceGallery
+from face_index import create_index
+from inference_server import InferenceServer
+from embedding_cache import EmbeddingCache
+from process_inference import ProcessInferenceBackend
+from camera_reader import create_camera_reader
+from stream_pipeline import StreamPipeline
+from detection_gate import DetectionGate
+from stream_encoder import StreamEncoder
+from frame_quality import FaceQualitySelector
+from camera_registry import Camera, CameraRegistry
+from face_persistence import WriteBehindPersister
+from face_store import RedisFaceStore
+from door_store import AsyncDoorStore, DoorStore
 
 # Camera index (0 = first laptop webcam)
 CAMERA_URL = 0  # Temporarily using laptop camera, can be changed to "http://192.168.1.12:81/stream" when using ESP32-CAM
 
+# One camera per locker column: id -> source and the doors it faces.
+# Door requests use the camera of the requesting door (or DEFAULT_CAMERA_ID),
+# /stream/<camera_id> serves each camera. Optional "roi": polygon
+# [(x, y), ...] in fractions of the frame (0..1) limiting stream face
+# detection to the area in front of the lockers
+CAMERAS = {
+    "cam_1": {"url": CAMERA_URL, "doors": ["door_1", "door_2", "door_3", "door_4"]},
+    # "cam_1": {..., "roi": [(0.2, 0.0), (0.8, 0.0), (0.8, 1.0), (0.2, 1.0)]},
+    # "cam_2": {"url": "http://192.168.1.13:81/stream", "doors": ["door_5", "door_6"]},
+}
+DEFAULT_CAMERA_ID = "cam_1"
+
 SERVER_DOOR_STATUS="server/door/status"
 SERVER_DOOR_EXECUTE="server/door/execute"
 
 DEVICE_DOOR_OPEN="device/door/open"
 
-app = Flask(__name__)
-cap = None  # Will be initialized when needed
+# Redis connection pool size, socket timeout (seconds) and retries on network errors
+REDIS_MAX_CONNECTIONS = 20
+REDIS_SOCKET_TIMEOUT = 5
+REDIS_RETRIES = 3
+
+# MQTT handler worker pool size and max queued messages per queue
+MQTT_HANDLER_WORKERS = 4
+MQTT_MAX_QUEUE_SIZE = 100
+
+# Door request I/O: "thread" (handlers on the MQTT worker pool, sync Redis) or
+# "asyncio" (one event loop runs MQTT + Redis for every door request, face
+# recognition runs on DOOR_RECOGNITION_WORKERS threads, at most
+# DOOR_MAX_CONCURRENT_REQUESTS requests in flight)
+DOOR_SERVICE_MODE = "thread"
+DOOR_RECOGNITION_WORKERS = 2
+DOOR_MAX_CONCURRENT_REQUESTS = 16
+
+# Face matching index: "flat" (exact) or "ivf" (approximate, for large galleries)
+# FACE_INDEX_NPROBE is the recall/latency knob of "ivf": more clusters scanned = better recall
+FACE_INDEX_BACKEND = "flat"
+FACE_INDEX_NPROBE = 8
+
+# Identity templates: up to FACE_TEMPLATE_SAMPLES diverse encodings per user
+# (pose / lighting), matched through their normalized centroid. A match
+# closer than FACE_SAMPLE_TOLERANCE to the centroid and at least
+# FACE_SAMPLE_MIN_DISTANCE from every kept sample becomes a new sample.
+# FACE_RERANK_CANDIDATES closest centroids are re-ranked by their nearest
+# sample (0 = centroid only)
+FACE_TEMPLATE_SAMPLES = 5
+FACE_SAMPLE_MIN_DISTANCE = 0.1
+FACE_SAMPLE_TOLERANCE = 0.4
+FACE_RERANK_CANDIDATES = 3
+
+# Face detector: "mtcnn" (accurate, slow on CPU), "yunet" / "ssd" (OpenCV DNN,
+# need a local model file) or "haar" (last resort); falls back to "haar" if the
+# model file is missing. FACE_DETECTION_SCALE < 1 detects on a downscaled frame.
+FACE_DETECTOR_BACKEND = "mtcnn"
+FACE_DETECTOR_MODEL_PATH = None  # e.g. "models/face_detection_yunet_2023mar.onnx"
+FACE_DETECTION_SCALE = 1.0
+
+# FaceNet engine: "keras" (TensorFlow) or "onnx" (ONNX Runtime, lower latency
+# and memory; export the model with export_facenet_onnx.py, "-int8" file for
+# the quantized one). Falls back to "keras" if the .onnx file is missing.
+FACE_EMBEDDER_BACKEND = "keras"
+FACE_EMBEDDER_MODEL_PATH = None  # e.g. "models/facenet-int8.onnx"
+
+# Embedding cache: a face crop that looks the same (dHash of the 160x160 crop
+# within EMBEDDING_CACHE_MAX_HASH_DISTANCE bits) in about the same place reuses
+# its embedding for up to EMBEDDING_CACHE_TTL seconds on the stream overlay.
+# Door requests only reuse an identical hash, so a near match can never hand
+# them the previous person's embedding. EMBEDDING_CACHE_SIZE = 0 disables it
+EMBEDDING_CACHE_SIZE = 256
+EMBEDDING_CACHE_TTL = 2.0
+EMBEDDING_CACHE_MAX_HASH_DISTANCE = 4
+
+# Micro-batching of face crops across streams and door requests
+INFERENCE_MAX_BATCH_SIZE = 16
+INFERENCE_MAX_WAIT_MS = 10
+
+# Inference backend: "thread" (one in-process worker, micro-batching) or
+# "process" (N worker processes with their own model copy, frames passed
+# through shared memory, scales with cores)
+INFERENCE_BACKEND = "thread"
+INFERENCE_PROCESSES = 2
+INFERENCE_INTRA_OP_THREADS = 2
+
+# Shared capture: number of buffered frames and max wait for a frame (seconds)
+CAMERA_FRAME_BUFFER = 30
+CAMERA_FRAME_TIMEOUT = 5
+
+# ESP32-CAM (http://) streams are parsed here instead of cv2.VideoCapture:
+# original JPEGs are forwarded to viewers when there is nothing to draw, and
+# only frames used for analysis are decoded, at CAMERA_DECODE_SCALE
+# (1.0, 0.5, 0.25 or 0.125 of the camera resolution)
+CAMERA_PASSTHROUGH = True
+CAMERA_DECODE_SCALE = 1.0
+
+# Stream tracking: detect every N frames (or when a track is lost) and reuse
+# each track's identity in between; False = detect + identify every frame
+FACE_TRACKING_ENABLED = True
+DETECT_EVERY_N_FRAMES = 10
+
+# Motion gate: stream detection is skipped while nothing moves in the camera
+# ROI (running-average background of a MOTION_GATE_WIDTH px wide gray frame,
+# MOTION_MIN_CHANGED_FRACTION of pixels changing by MOTION_PIXEL_THRESHOLD).
+# Detection still runs every MOTION_REFRESH_INTERVAL seconds, and an idle
+# scene is only analysed at MOTION_IDLE_FPS
+MOTION_GATE_ENABLED = True
+MOTION_GATE_WIDTH = 160
+MOTION_PIXEL_THRESHOLD = 25
+MOTION_MIN_CHANGED_FRACTION = 0.002
+MOTION_REFRESH_INTERVAL = 2.0
+MOTION_IDLE_FPS = 5
+
+# MJPEG stream output: JPEG quality, scale (0.5 = half resolution) and max FPS.
+# Each frame is encoded once and the same bytes are sent to every viewer
+STREAM_JPEG_QUALITY = 70
+STREAM_SCALE = 1.0
+STREAM_MAX_FPS = 15
+
+# Door recognition capture window: up to DOOR_CAPTURE_FRAMES frames captured
+# after the request arrived (collected for at most DOOR_CAPTURE_WINDOW seconds)
+# are ranked by sharpness. Faces are detected on the sharpest one, the next of
+# the DOOR_CANDIDATE_FRAMES sharpest is only tried when no face passes, and
+# only the best face (confidence x size x sharpness) is embedded
+DOOR_CAPTURE_FRAMES = 8
+DOOR_CAPTURE_WINDOW = 0.3
+DOOR_CANDIDATE_FRAMES = 3
+DOOR_MIN_FACE_CONFIDENCE = 0.9
+DOOR_MIN_FACE_SIZE = 40
+
+# Face data persistence: max seconds before a change reaches Redis,
+# and delay to coalesce bursts of changes into one write
+FACE_DATA_FLUSH_INTERVAL = 5
+FACE_DATA_COALESCE_DELAY = 0.5
 
-# Initialize MQTT Service
-mqtt_service = MQTTService()
+app = Flask(__name__)
 
-redis = RedisService(host="172.19.201.135", port=6379, db=1, password="vund1310")
+def mqtt_queue_key(topic, payload):
+    """
+    Order door status messages per door and door requests per camera
+    (requests of different locker columns run side by side), everything
+    else per topic
+    """
+    if topic == SERVER_DOOR_STATUS:
+        try:
+            return f"{topic}:{json.loads(payload).get('door')}"
+        except (ValueError, AttributeError):
+            pass
+    elif topic == SERVER_DOOR_EXECUTE:
+        try:
+            _, camera = parse_door_request(payload)
+            return f"{topic}:{camera.camera_id}"
+        except (TypeError, AttributeError):
+            pass
+    return topic
+
+
+REDIS_CONNECTION = dict(host="172.19.201.135", port=6379, db=1, password="vund1310",
+                        max_connections=REDIS_MAX_CONNECTIONS,
+                        socket_timeout=REDIS_SOCKET_TIMEOUT,
+                        retries=REDIS_RETRIES)
+
+if DOOR_SERVICE_MODE == "asyncio":
+    # MQTT driven by the event loop, messages ordered per queue key
+    mqtt_service = AsyncMQTTService(max_concurrency=DOOR_MAX_CONCURRENT_REQUESTS,
+                                    executor_workers=DOOR_RECOGNITION_WORKERS,
+                                    queue_key=mqtt_queue_key)
+    # Door requests use their own awaitable Redis client (connected on the loop)
+    async_redis = AsyncRedisService(**REDIS_CONNECTION)
+else:
+    # Initialize MQTT Service (handlers run on a worker pool, ordered per queue key)
+    mqtt_service = MQTTService(max_workers=MQTT_HANDLER_WORKERS,
+                               max_queue_size=MQTT_MAX_QUEUE_SIZE,
+                               queue_key=mqtt_queue_key)
+    async_redis = None
+
+# Face data, door index rebuild and the HTTP API stay on the sync client
+redis = RedisService(**REDIS_CONNECTION)
 
 doors = [
     "door_1",
@@ -33,89 +214,111 @@ doors = [
     "door_4",
 ]
 
+# Door state with free-door set and user_id -> door index (atomic claim/release)
+door_store = DoorStore(redis, doors)
+async_door_store = AsyncDoorStore(async_redis, doors) if async_redis is not None else None
+
 # === Initialize global variables ===
 FACE_DIR = "faces"
 os.makedirs(FACE_DIR, exist_ok=True)
 
-# Initialize FaceNet service
-facenet_service = FaceNetService()
+# Shared by every stream and door request of the chosen inference backend
+embedding_cache = None
+if EMBEDDING_CACHE_SIZE > 0:
+    embedding_cache = EmbeddingCache(max_size=EMBEDDING_CACHE_SIZE,
+                                     ttl=EMBEDDING_CACHE_TTL,
+                                     max_hash_distance=EMBEDDING_CACHE_MAX_HASH_DISTANCE)
+
+if INFERENCE_BACKEND == "process":
+    # Worker processes are forked here, before any other thread is started
+    inference_server = ProcessInferenceBackend(num_workers=INFERENCE_PROCESSES,
+                                               intra_op_threads=INFERENCE_INTRA_OP_THREADS,
+                                               max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+                                               service_kwargs={
+                                                   "detector_backend": FACE_DETECTOR_BACKEND,
+                                                   "detector_model_path": FACE_DETECTOR_MODEL_PATH,
+                                                   "detection_scale": FACE_DETECTION_SCALE,
+                                                   "embedder_backend": FACE_EMBEDDER_BACKEND,
+                                                   "embedder_model_path": FACE_EMBEDDER_MODEL_PATH,
+                                                   "embedder_threads": INFERENCE_INTRA_OP_THREADS,
+                                               },
+                                               embedding_cache=embedding_cache)
+    atexit.register(inference_server.stop)
+else:
+    # Initialize FaceNet service: models load + warm up in the background,
+    # Flask/MQTT start right away and /status reports readiness
+    facenet_service = FaceNetService(lazy=True, warmup_batch_size=INFERENCE_MAX_BATCH_SIZE,
+                                     detector_backend=FACE_DETECTOR_BACKEND,
+                                     detector_model_path=FACE_DETECTOR_MODEL_PATH,
+                                     detection_scale=FACE_DETECTION_SCALE,
+                                     embedder_backend=FACE_EMBEDDER_BACKEND,
+                                     embedder_model_path=FACE_EMBEDDER_MODEL_PATH,
+                                     embedding_cache=embedding_cache)
+    facenet_service.start_loading()
+
+    # All detection/embedding goes through one worker that batches face crops
+    inference_server = InferenceServer(facenet_service,
+                                       max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+                                       max_wait_ms=INFERENCE_MAX_WAIT_MS)
+inference_server.start()
+
+# Door recognition picks the best face of a short capture window
+face_selector = FaceQualitySelector(candidate_frames=DOOR_CANDIDATE_FRAMES,
+                                    min_confidence=DOOR_MIN_FACE_CONFIDENCE,
+                                    min_face_size=DOOR_MIN_FACE_SIZE)
 
 # Initialize face recognition data (will be loaded from Redis)
-known_encodings = []
-known_ids = []
-next_id = 0  # New user ID will increment
+# Identity centroids live in one normalized matrix for fast matching.
+# Matching reads a copy-on-write snapshot without locking; enroll/remove
+# publish a new version, and the gallery hands out new user IDs
+gallery = FaceGallery(index=create_index(FACE_INDEX_BACKEND, nprobe=FACE_INDEX_NPROBE),
+                      max_samples=FACE_TEMPLATE_SAMPLES,
+                      rerank=FACE_RERANK_CANDIDATES,
+                      min_sample_distance=FACE_SAMPLE_MIN_DISTANCE,
+                      sample_tolerance=FACE_SAMPLE_TOLERANCE)
 
-# Lock to ensure thread-safe face recognition processing
-face_recognition_lock = threading.Lock()
+# Face embeddings are stored as raw float32 bytes, one hash field per user
+face_store = RedisFaceStore(redis)
 
-# Load face recognition data from Redis on startup
+# Gallery changes are written to Redis in the background, bursts coalesced
+face_persister = WriteBehindPersister(face_store.write_changes,
+                                      flush_interval=FACE_DATA_FLUSH_INTERVAL,
+                                      coalesce_delay=FACE_DATA_COALESCE_DELAY)
+face_persister.start()
+atexit.register(face_persister.stop)
 
 
-def save_face_data_to_redis():
-    """Save face recognition data to Redis"""
-    try:
-        with face_recognition_lock:
-            face_data = {
-                "known_ids": known_ids,
-                "next_id": next_id,
-                "known_encodings": [enc.tolist() for enc in known_encodings]  # Convert numpy arrays to lists
-            }
-            redis.set("face_recognition_data", json.dumps(face_data))
-            print(f"Saved face data to Redis: {len(known_ids)} faces, next_id={next_id}")
-    except Exception as e:
-        print(f"Error saving face data to Redis: {e}")
+def save_face_data_to_redis(user_id, face_encoding=None):
+    """Schedule saving one user's face data to Redis (None = removed, never blocks)"""
+    face_persister.record_change(user_id, face_encoding)
 
 
-def update_next_id():
-    """Update next_id to the smallest unused ID"""
-    global next_id, known_ids
+def forget_user_face_data(user_id):
+    """Record a removed user in Redis and delete their face images (writer lock held)"""
+    # Save updated data to Redis
+    save_face_data_to_redis(user_id, None)
 
-    with face_recognition_lock:
-        if len(known_ids) == 0:
-            next_id = 0
-        else:
-            # Find the smallest unused ID starting from 0
-            used_ids = set(known_ids)
-            next_id = 0
-            while next_id in used_ids:
-                next_id += 1
-        print(f"Updated next_id to {next_id}")
+    # Remove face images folder
+    user_dir = os.path.join(FACE_DIR, f"id_{user_id}")
+    if os.path.exists(user_dir):
+        import shutil
+        shutil.rmtree(user_dir)
+        print(f"Removed face images folder: {user_dir}")
+    else:
+        print(f"Face images folder not found: {user_dir}")
 
 
 def remove_user_face_data(user_id):
     """Remove face recognition data for a specific user"""
-    global known_encodings, known_ids
-
     try:
-        with face_recognition_lock:
-            # Find index of user_id in known_ids
-            if user_id in known_ids:
-                index = known_ids.index(user_id)
-
-                # Remove from all arrays
-                known_encodings.pop(index)
-                known_ids.pop(index)
-
-                # Update next_id to reuse freed ID
-                update_next_id()
-
-                # Remove face images folder
-                user_dir = os.path.join(FACE_DIR, f"id_{user_id}")
-                if os.path.exists(user_dir):
-                    import shutil
-                    shutil.rmtree(user_dir)
-                    print(f"Removed face images folder: {user_dir}")
-                else:
-                    print(f"Face images folder not found: {user_dir}")
-
-                # Save updated data to Redis
-                save_face_data_to_redis()
-
-                print(f"Removed face recognition data for user_id {user_id}")
-                return True
-            else:
-                print(f"User_id {user_id} not found in known_ids")
-                return False
+        # Remove user's row from the gallery; Redis record and images are
+        # cleared before the freed ID can go to a newly enrolled face
+        if gallery.remove(user_id, on_removed=forget_user_face_data):
+            print(f"Removed face recognition data for user_id {user_id}")
+            return True
+        else:
+            print(f"User_id {user_id} not found in gallery")
+            return False
 
     except Exception as e:
         print(f"Error removing face data for user_id {user_id}: {e}")
@@ -124,19 +327,12 @@ def remove_user_face_data(user_id):
 
 def load_face_data_from_redis():
     """Load face recognition data from Redis"""
-    global known_encodings, known_ids, next_id
     try:
-        face_data_str = redis.get("face_recognition_data")
-        if face_data_str:
-            face_data = json.loads(face_data_str)
-            with face_recognition_lock:
-                known_ids = face_data.get("known_ids", [])
-                # Convert lists back to numpy arrays
-                known_encodings = [np.array(enc) for enc in face_data.get("known_encodings", [])]
-
-                # Update next_id based on loaded data
-                update_next_id()
-            print(f"Loaded face data from Redis: {len(known_ids)} faces, next_id={next_id}")
+        # Bulk-load every identity's samples, one centroid row per identity
+        ids, samples = face_store.load()
+        if len(ids) > 0:
+            gallery.load(ids, samples)
+            print(f"Loaded face data from Redis: {len(gallery)} faces, next_id={gallery.next_id}")
             return True
         else:
             print("No face data found in Redis, starting fresh")
@@ -177,143 +373,124 @@ def door_status_handler(message):
         door_name = data.get("door")
         door_status = data.get("status")
         if door_name in doors:
-            # Update door status to closed (USED)
-            data_door = redis.hgetall("data_door")
-            if door_name in data_door:
-                door_data = json.loads(data_door[door_name])
-                door_data["status"] = door_status
-                redis.hset("data_door", {door_name: json.dumps(door_data)})
+            # Update door status to closed (USED), atomically in Redis
+            if door_store.update_status(door_name, door_status):
                 print(f"Updated door {door_name} status to {'OPEN' if door_status == StatusDoor.OPEN.value else 'CLOSED'}")
     except Exception as e:
         print(f"Error processing door status: {e}")
 
 
-def get_empty_door():
-    """Find first empty door from top to bottom"""
-    data_door = redis.hgetall("data_door")
-    
-    for door in doors:
-        if door not in data_door:
-            # Door not in Redis -> empty
-            return door
-        else:
-            door_data = json.loads(data_door[door])
-            user_id = door_data.get("user_id")
-            if user_id is None:
-                return door
-    return None  # No empty doors left
-
-
-def recognize_face_from_camera():
-    """Recognize face from camera and return user_id"""
-    global known_encodings, known_ids, next_id
-    
-    cap_temp = cv2.VideoCapture(CAMERA_URL)
-    if not cap_temp.isOpened():
-        print("Cannot connect to camera")
-        return None
-    
-    # Read some frames to ensure we have a good frame
-    for _ in range(5):
-        ret, frame = cap_temp.read()
-        if ret and frame is not None:
+def capture_window(camera, since):
+    """
+    Frames of a camera captured at or after since (oldest first)
+
+    Buffered frames count, then new ones are collected until there are
+    DOOR_CAPTURE_FRAMES or DOOR_CAPTURE_WINDOW seconds passed (waiting up to
+    CAMERA_FRAME_TIMEOUT for the first one). Older frames may show whoever
+    stood at the locker before the request and are never used.
+    """
+    last_seq = camera.reader.last_seq
+    # Older buffered frames are skipped before they are decoded
+    entries = camera.reader.recent(DOOR_CAPTURE_FRAMES, since=since)
+    if entries:
+        last_seq = max(last_seq, entries[-1][0])
+    frames = [frame for _, _, frame in entries]
+    deadline = since + DOOR_CAPTURE_WINDOW
+    while len(frames) < DOOR_CAPTURE_FRAMES:
+        timeout = deadline - time.time() if frames else CAMERA_FRAME_TIMEOUT
+        if timeout <= 0:
             break
-    
-    if not ret or frame is None:
-        cap_temp.release()
-        return None
-    
-    # Detect faces using FaceNet
-    face_locations = facenet_service.detect_faces(frame)
-    
-    if len(face_locations) == 0:
-        cap_temp.release()
+        latest = camera.reader.wait_for_frame(last_seq, timeout=timeout)
+        if latest is None:
+            break
+        last_seq, timestamp, frame = latest
+        if timestamp >= since:
+            frames.append(frame)
+    return frames
+
+
+def recognize_face_from_camera(camera=None, requested_at=None):
+    """
+    Recognize face from camera (default camera if None) and return user_id
+
+    Only frames captured at or after requested_at (default: now) are used
+    """
+    camera = camera or camera_registry.default
+    if requested_at is None:
+        requested_at = time.time()
+
+    # Capture window from the shared buffer (no reconnect / warm-up)
+    camera.start()
+    frames = capture_window(camera, requested_at)
+    if not frames:
+        print(f"Cannot connect to camera {camera.camera_id}")
         return None
     
     try:
-        # Get encoding of first face
-        face_encoding = facenet_service.get_face_encoding(frame, face_locations[0])
+        # Best face of the window, the only one that gets embedded
+        best = face_selector.select(frames, inference_server.detect_faces_with_scores)
+        if best is None:
+            return None
+        frame, face_location, _ = best
+        
+        face_encoding = inference_server.get_face_encodings(frame, [face_location], exact_cache=True)[0]
         if face_encoding is None:
-            cap_temp.release()
             return None
         
-        with face_recognition_lock:
-            # If no data yet, add first person
-            if len(known_encodings) == 0:
-                user_id = next_id
-                next_id += 1
-                known_encodings.append(face_encoding)
-                known_ids.append(user_id)
-                top, right, bottom, left = face_locations[0]
-                face_image = frame[top:bottom, left:right]
-                save_face_image(face_image, user_id)
-                # save_face_data_to_redis()  # Save to Redis after adding new face
-                cap_temp.release()
-                return user_id
-            else:
-                # Match with known faces
-                matches = facenet_service.compare_faces(known_encodings, face_encoding, tolerance=0.6)
-                face_distances = facenet_service.face_distance(known_encodings, face_encoding)
-                best_match_index = np.argmin(face_distances) if len(face_distances) > 0 else None
-                
-                # If matches existing person
-                if best_match_index is not None and matches[best_match_index]:
-                    user_id = known_ids[best_match_index]
-                    cap_temp.release()
-                    return user_id
-                else:
-                    # New face -> create new ID
-                    user_id = next_id
-                    next_id += 1
-                    known_encodings.append(face_encoding)
-                    known_ids.append(user_id)
-                    top, right, bottom, left = face_locations[0]
-                    face_image = frame[top:bottom, left:right]
-                    save_face_image(face_image, user_id)
-                    # save_face_data_to_redis()  # Save to Redis after adding new face
-                    cap_temp.release()
-                    return user_id
+        # Match with known faces, new face (or no data yet) -> new ID
+        user_id, is_new = gallery.enroll(face_encoding, tolerance=0.6)
+        if is_new:
+            top, right, bottom, left = face_location
+            face_image = frame[top:bottom, left:right]
+            save_face_image(face_image, user_id)
+            save_face_data_to_redis(user_id, face_encoding)  # Save to Redis after adding new face
+        elif gallery.learn(user_id, face_encoding):
+            # New pose / lighting of a known user
+            save_face_data_to_redis(user_id, gallery.samples(user_id))
+        return user_id
     except Exception as e:
         print(f"Face recognition error: {e}")
-        cap_temp.release()
         return None
 
 
-def find_door_by_user_id(user_id):
-    """Find door assigned to user_id"""
-    data_door = redis.hgetall("data_door")
-    
-    for door, door_data_str in data_door.items():
-        try:
-            door_data = json.loads(door_data_str)
-            if door_data.get("user_id") == user_id:
-                return door
-        except:
-            continue
-    
-    return None
+def parse_door_request(message):
+    """
+    Door execute payload -> (action, camera)
+
+    Payload is "SEND" / "GET", or JSON {"action": "SEND", "door": "door_5"}
+    ({"camera": "cam_2"} also accepted) to use the camera of that door
+    """
+    try:
+        request_data = json.loads(message)
+    except ValueError:
+        return message, camera_registry.default
+    if not isinstance(request_data, dict):
+        return message, camera_registry.default
+    camera = camera_registry.route(request_data.get("camera"), request_data.get("door"))
+    return request_data.get("action"), camera
 
 
 def door_excute_handler(message):
     """Handler for door/execute topic - handle sending and retrieving items"""
     print(f"Door execute: {message}")
+    # Frames captured before this point may show the previous person
+    requested_at = time.time()
+    action, camera = parse_door_request(message)
     
-    if message == "SEND":
+    if action == "SEND":
         # Handle sending items
         print("Received send request")
         
         # Check for empty door
-        empty_door = get_empty_door()
-        
-        if empty_door is None:
+        if not door_store.has_free_door():
             # All doors are occupied
             print("All doors are occupied")
             mqtt_service.publish("device/door/full", "ALL_DOORS_OCCUPIED", qos=1)
             return
         
         # Recognize face
-        print("Recognizing face...")
-        user_id = recognize_face_from_camera()
+        print(f"Recognizing face on camera {camera.camera_id}...")
+        user_id = recognize_face_from_camera(camera, requested_at)
         
         if user_id is None:
             print("Cannot recognize face")
@@ -322,24 +499,33 @@ def door_excute_handler(message):
         
         print(f"Recognized face with ID: {user_id}")
         
-        # Save information to Redis
-        door_data = {
-            "status": StatusDoor.OPEN.value,  # Door is open (not closed yet)
-            "user_id": user_id
-        }
-        redis.hset("data_door", {empty_door: json.dumps(door_data)})
+        # Claim first empty door and save information to Redis (atomic)
+        # Door is open (not closed yet)
+        empty_door, claimed = door_store.claim(user_id, StatusDoor.OPEN.value)
+        
+        if empty_door is None:
+            # Another request took the last door meanwhile
+            print("All doors are occupied")
+            mqtt_service.publish("device/door/full", "ALL_DOORS_OCCUPIED", qos=1)
+            return
+        
+        if not claimed:
+            # User already has items in a door, do not hand out a second one
+            print(f"user_id {user_id} already holds door {empty_door}")
+            mqtt_service.publish("device/door/error", json.dumps({"error": "DOOR_ALREADY_ASSIGNED", "user_id": user_id, "door": empty_door}), qos=1)
+            return
         
         # Send message to open door
         mqtt_service.publish(DEVICE_DOOR_OPEN, json.dumps({"door": empty_door}), qos=1)
         print(f"Assigned door {empty_door} to user_id {user_id}")
         
-    elif message == "GET":
+    elif action == "GET":
         # Handle retrieving items
         print("Received retrieve request")
         
         # Recognize face
-        print("Recognizing face...")
-        user_id = recognize_face_from_camera()
+        print(f"Recognizing face on camera {camera.camera_id}...")
+        user_id = recognize_face_from_camera(camera, requested_at)
         
         if user_id is None:
             print("Cannot recognize face")
@@ -349,7 +535,7 @@ def door_excute_handler(message):
         print(f"Recognized face with ID: {user_id}")
         
         # Find door assigned to this user_id
-        door_name = find_door_by_user_id(user_id)
+        door_name = door_store.find_by_user(user_id)
         
         if door_name is None:
             print(f"Cannot find door for user_id {user_id}")
@@ -363,100 +549,188 @@ def door_excute_handler(message):
         # Remove user's face recognition data after successful retrieval
         remove_user_face_data(user_id)
 
-        # Clear door data after retrieving (or mark as empty)
-        door_data = {
-            "status": StatusDoor.OPEN.value,
-            "user_id": None
-        }
-        redis.hset("data_door", {door_name: json.dumps(door_data)})
+        # Clear door data after retrieving (mark as empty, back in free set)
+        door_store.release(door_name, StatusDoor.OPEN.value)
 
 
-def generate():
-    global next_id, cap
-    
-    # Initialize camera if not already initialized
-    if cap is None:
-        cap = cv2.VideoCapture(CAMERA_URL)
-
-    while True:
-        ret, frame = cap.read()
-        if not ret or frame is None:
-            print("[Warning] Cannot read frame — reconnecting...")
-            cap.release()
-            cap = cv2.VideoCapture(CAMERA_URL)
-            continue
+async def door_status_handler_async(message):
+    """door_status_handler on the event loop (DOOR_SERVICE_MODE = "asyncio")"""
+    print(f"Door status: {message}")
+    try:
+        data = json.loads(message)
+        door_name = data.get("door")
+        door_status = data.get("status")
+        if door_name in doors:
+            if await async_door_store.update_status(door_name, door_status):
+                print(f"Updated door {door_name} status to {'OPEN' if door_status == StatusDoor.OPEN.value else 'CLOSED'}")
+    except Exception as e:
+        print(f"Error processing door status: {e}")
 
-        # Ensure frame is valid
-        if frame.ndim != 3 or frame.shape[2] != 3:
-            print("[Warning] Invalid frame format")
-            continue
 
-        # Detect faces using FaceNet
-        face_locations = facenet_service.detect_faces(frame)
+async def door_execute_handler_async(message):
+    """
+    door_excute_handler on the event loop (DOOR_SERVICE_MODE = "asyncio")
 
-        # If no faces detected, continue streaming
-        if len(face_locations) == 0:
-            _, jpeg = cv2.imencode('.jpg', frame)
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n')
+    Redis and MQTT calls are awaited on the loop; face recognition and face
+    data removal (CPU / disk) run in the MQTT service executor, so a waiting
+    request holds no thread
+    """
+    print(f"Door execute: {message}")
+    # Frames captured before this point may show the previous person
+    requested_at = time.time()
+    action, camera = parse_door_request(message)
+    if action not in ("SEND", "GET"):
+        return
+    loop = asyncio.get_running_loop()
+
+    if action == "SEND" and not await async_door_store.has_free_door():
+        print("All doors are occupied")
+        mqtt_service.publish("device/door/full", "ALL_DOORS_OCCUPIED", qos=1)
+        return
+
+    print(f"Recognizing face on camera {camera.camera_id}...")
+    user_id = await loop.run_in_executor(mqtt_service.executor, recognize_face_from_camera,
+                                         camera, requested_at)
+    if user_id is None:
+        print("Cannot recognize face")
+        mqtt_service.publish("door/error", "FACE_RECOGNITION_FAILED", qos=1)
+        return
+    print(f"Recognized face with ID: {user_id}")
+
+    if action == "SEND":
+        # Claim first empty door (atomic), door is open (not closed yet)
+        empty_door, claimed = await async_door_store.claim(user_id, StatusDoor.OPEN.value)
+        if empty_door is None:
+            print("All doors are occupied")
+            mqtt_service.publish("device/door/full", "ALL_DOORS_OCCUPIED", qos=1)
+            return
+        if not claimed:
+            print(f"user_id {user_id} already holds door {empty_door}")
+            mqtt_service.publish("device/door/error", json.dumps({"error": "DOOR_ALREADY_ASSIGNED", "user_id": user_id, "door": empty_door}), qos=1)
+            return
+        mqtt_service.publish(DEVICE_DOOR_OPEN, json.dumps({"door": empty_door}), qos=1)
+        print(f"Assigned door {empty_door} to user_id {user_id}")
+        return
+
+    door_name = await async_door_store.find_by_user(user_id)
+    if door_name is None:
+        print(f"Cannot find door for user_id {user_id}")
+        mqtt_service.publish("device/door/error", json.dumps({"error": "NO_DOOR_ASSIGNED", "user_id": user_id}), qos=1)
+        return
+    mqtt_service.publish(DEVICE_DOOR_OPEN, json.dumps({"door": door_name}), qos=1)
+    print(f"Opened door {door_name} for user_id {user_id}")
+
+    # Remove user's face data, then put the door back in the free set
+    await loop.run_in_executor(mqtt_service.executor, remove_user_face_data, user_id)
+    await async_door_store.release(door_name, StatusDoor.OPEN.value)
+
+
+async def serve_doors_async():
+    """Run MQTT + async Redis door handling on this event loop until cancelled"""
+    await async_redis.ping()
+    mqtt_service.subscribe(SERVER_DOOR_STATUS, door_status_handler_async)
+    mqtt_service.subscribe(SERVER_DOOR_EXECUTE, door_execute_handler_async)
+    await mqtt_service.connect()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await mqtt_service.disconnect()
+        await async_redis.close()
+
+
+def identify_faces(frame, face_locations, face_encodings):
+    """
+    Match face encodings against the gallery, enrolling unknown faces
+
+    Returns:
+        List of user_ids aligned with face_locations (None if not encoded)
+    """
+    user_ids = []
+    for face_location, face_encoding in zip(face_locations, face_encodings):
+        if face_encoding is None:
+            user_ids.append(None)
             continue
 
-        # Iterate through detected faces
-        with face_recognition_lock:
-            for face_location in face_locations:
-                top, right, bottom, left = face_location
-                
-                # Encode face
-                try:
-                    face_encoding = facenet_service.get_face_encoding(frame, face_location)
-                    if face_encoding is None:
-                        continue
-                except Exception as e:
-                    print(f"[Error] Encoding error: {e}")
-                    continue
-
-                # If no data yet, add first person
-                if len(known_encodings) == 0:
-                    user_id = next_id
-                    next_id += 1
-                    known_encodings.append(face_encoding)
-                    known_ids.append(user_id)
-                    face_image = frame[top:bottom, left:right]
-                    save_face_image(face_image, user_id)
-                    save_face_data_to_redis()  # Save to Redis after adding new face
-                else:
-                    # Match with known faces
-                    matches = facenet_service.compare_faces(known_encodings, face_encoding, tolerance=0.6)
-                    face_distances = facenet_service.face_distance(known_encodings, face_encoding)
-                    best_match_index = np.argmin(face_distances) if len(face_distances) > 0 else None
-
-                    # If matches existing person
-                    if best_match_index is not None and matches[best_match_index]:
-                        user_id = known_ids[best_match_index]
-                    else:
-                        # New face -> create new ID
-                        user_id = next_id
-                        next_id += 1
-                        known_encodings.append(face_encoding)
-                        known_ids.append(user_id)
-                        face_image = frame[top:bottom, left:right]
-                        save_face_image(face_image, user_id)
-                        save_face_data_to_redis()  # Save to Redis after adding new face
-
-                # Draw bounding box + ID
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                cv2.putText(frame, f"ID {user_id}", (left, top - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-
-        # Return frame for stream
-        _, jpeg = cv2.imencode('.jpg', frame)
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + jpeg.tobytes() + b'\r\n')
+        # Match with known faces, new face (or no data yet) -> new ID
+        user_id, is_new = gallery.enroll(face_encoding, tolerance=0.6)
+        if is_new:
+            top, right, bottom, left = face_location
+            face_image = frame[top:bottom, left:right]
+            save_face_image(face_image, user_id)
+            save_face_data_to_redis(user_id, face_encoding)  # Save to Redis after adding new face
+        elif gallery.learn(user_id, face_encoding):
+            # New pose / lighting of a known user
+            save_face_data_to_redis(user_id, gallery.samples(user_id))
+        user_ids.append(user_id)
+
+    return user_ids
+
+
+def build_camera(camera_id, config):
+    """Capture, face analysis and stream output of one camera"""
+    reader = create_camera_reader(config["url"], passthrough=CAMERA_PASSTHROUGH,
+                                  decode_scale=CAMERA_DECODE_SCALE,
+                                  buffer_size=CAMERA_FRAME_BUFFER)
+
+    # Skip detection on a static scene, detect only inside the ROI
+    gate = None
+    if MOTION_GATE_ENABLED or config.get("roi"):
+        gate = DetectionGate(roi=config.get("roi"),
+                             motion=MOTION_GATE_ENABLED,
+                             width=MOTION_GATE_WIDTH,
+                             pixel_threshold=MOTION_PIXEL_THRESHOLD,
+                             min_changed_fraction=MOTION_MIN_CHANGED_FRACTION,
+                             refresh_interval=MOTION_REFRESH_INTERVAL,
+                             idle_fps=MOTION_IDLE_FPS)
+
+    # Background face analysis: detect every K frames, track in between
+    pipeline = StreamPipeline(reader, inference_server, identify_faces,
+                              tracking=FACE_TRACKING_ENABLED,
+                              detect_every=DETECT_EVERY_N_FRAMES,
+                              frame_timeout=CAMERA_FRAME_TIMEOUT,
+                              gate=gate)
+
+    # Stream output: annotate + encode once per frame, shared by all viewers
+    encoder = StreamEncoder(reader, annotate=pipeline.annotate,
+                            has_overlay=lambda: bool(pipeline.tracks()),
+                            quality=STREAM_JPEG_QUALITY,
+                            scale=STREAM_SCALE,
+                            max_fps=STREAM_MAX_FPS,
+                            frame_timeout=CAMERA_FRAME_TIMEOUT)
+
+    # Raw video (?raw=1): camera JPEGs as-is when the camera allows it
+    raw_encoder = StreamEncoder(reader,
+                                quality=STREAM_JPEG_QUALITY,
+                                scale=STREAM_SCALE,
+                                max_fps=STREAM_MAX_FPS,
+                                frame_timeout=CAMERA_FRAME_TIMEOUT)
+
+    return Camera(camera_id, reader, doors=config.get("doors", ()),
+                  pipeline=pipeline, encoder=encoder, raw_encoder=raw_encoder)
+
+
+# Every camera has its own capture worker; all share one inference backend
+camera_registry = CameraRegistry(DEFAULT_CAMERA_ID)
+for camera_id, camera_config in CAMERAS.items():
+    camera_registry.add(build_camera(camera_id, camera_config))
+
+
+def stream_response(camera):
+    raw = request.args.get('raw', '0').lower() in ('1', 'true', 'yes')
+    # Same encoded multipart chunk for every viewer of this camera
+    return Response(camera.stream(raw), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
 @app.route('/stream')
 def stream():
-    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return stream_response(camera_registry.default)
+
+
+@app.route('/stream/<camera_id>')
+def camera_stream(camera_id):
+    if camera_id not in camera_registry:
+        return {'error': f'Unknown camera {camera_id}', 'cameras': camera_registry.ids}, 404
+    return stream_response(camera_registry.get(camera_id))
 
 
 @app.route('/test_publish', methods=['POST'])
@@ -494,10 +768,14 @@ def status():
     return {
         'status': 'running',
         'mqtt': 'connected' if mqtt_status else 'disconnected',
-        'known_faces': len(known_ids),
-        'camera_url': CAMERA_URL,
-        'face_recognition_enabled': True,
-        'face_recognition_method': 'FaceNet'
+        'mqtt_dispatch': mqtt_service.stats(),
+        'known_faces': len(gallery),
+        'face_recognition_enabled': inference_server.is_ready(),
+        'models': inference_server.status(),
+        'face_recognition_method': 'FaceNet',
+        'inference': inference_server.stats(),
+        'embedding_cache': embedding_cache.stats() if embedding_cache is not None else None,
+        'cameras': camera_registry.stats()
     }
 
 
@@ -505,7 +783,7 @@ def status():
 def get_doors_status():
     """Display door status with beautiful UI"""
     try:
-        data_door = redis.hgetall("data_door")
+        data_door = door_store.all_doors()
 
         doors_status = {}
         stats = {'empty': 0, 'used': 0, 'open': 0}
@@ -548,7 +826,7 @@ def get_doors_status():
 def get_doors_api():
     """Get doors status as JSON API"""
     try:
-        data_door = redis.hgetall("data_door")
+        data_door = door_store.all_doors()
 
         doors_status = {}
         for door_name in doors:
@@ -622,11 +900,25 @@ def check_redis_connection():
 
 if __name__ == "__main__":
     load_face_data_from_redis()
-    # Subscribe to topics
-    mqtt_service.subscribe(SERVER_DOOR_STATUS, door_status_handler)
-    mqtt_service.subscribe(SERVER_DOOR_EXECUTE, door_excute_handler)
+    door_store.rebuild_index()
 
-    mqtt_service.connect()
+    if DOOR_SERVICE_MODE == "asyncio":
+        camera_registry.start()
 
-    # Start Flask app
-    app.run(host='0.0.0.0', port=5000, debug=False)
+        # Flask serves HTTP from a thread, door requests run on the event loop
+        threading.Thread(target=app.run, kwargs={"host": "0.0.0.0", "port": 5000, "debug": False},
+                         name="flask", daemon=True).start()
+        try:
+            asyncio.run(serve_doors_async())
+        except KeyboardInterrupt:
+            pass
+    else:
+        # Subscribe to topics
+        mqtt_service.subscribe(SERVER_DOOR_STATUS, door_status_handler)
+        mqtt_service.subscribe(SERVER_DOOR_EXECUTE, door_excute_handler)
+
+        mqtt_service.connect()
+        camera_registry.start()
+
+        # Start Flask app
+        app.run(host='0.0.0.0', port=5000, debug=False)
@@ -0,0 +1,242 @@
+import paho.mqtt.client as mqtt
+import asyncio
+import inspect
+import socket, uuid
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncMQTTService:
+    """
+    asyncio counterpart of MQTTService
+
+    paho runs on the event loop (socket readiness via add_reader/add_writer,
+    no loop_start thread). Coroutine handlers are awaited on the loop,
+    plain handlers (e.g. CPU-heavy face recognition) run in a small thread
+    pool. Messages with the same queue key run in order.
+    """
+
+    def __init__(
+        self,
+        broker="192.168.72.221",
+        port=1883,
+        username="vund",
+        password="131003",
+        client_id = f"FaceRec-{socket.gethostname()}-{uuid.uuid4().hex[:6]}",
+        max_concurrency=16,
+        executor_workers=2,
+        queue_key=None,
+    ):
+        self.broker = broker
+        self.port = port
+        self.client_id = client_id
+        self.topic_handlers = {}
+
+        self.queue_key = queue_key or (lambda topic, payload: topic)
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="mqtt-cpu")
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self._key_locks = {}
+        self._pending = {}  # queue key -> messages waiting or running
+        self._metrics = {}  # topic -> counters
+        self._loop = None
+        self._misc_task = None
+        self._reconnect_task = None
+        self._stopping = False
+        self._min_delay = 1
+        self._max_delay = 30
+
+        self.client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION1,
+            client_id=client_id,
+            protocol=mqtt.MQTTv311
+        )
+
+        self.client.username_pw_set(username, password)
+
+        # Callbacks
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_message = self.on_message
+
+        # Socket callbacks: drive paho from the asyncio loop
+        self.client.on_socket_open = self.on_socket_open
+        self.client.on_socket_close = self.on_socket_close
+        self.client.on_socket_register_write = self.on_socket_register_write
+        self.client.on_socket_unregister_write = self.on_socket_unregister_write
+
+        self.client.max_inflight_messages_set(10)
+        self.client.max_queued_messages_set(50)
+
+        # Last will
+        self.client.will_set("status/client", "offline", qos=1, retain=False)
+
+    # ================= SOCKET CALLBACKS =================
+
+    def on_socket_open(self, client, userdata, sock):
+        self._loop.add_reader(sock, client.loop_read)
+        self._misc_task = self._loop.create_task(self._misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        self._loop.remove_reader(sock)
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            self._misc_task = None
+
+    def on_socket_register_write(self, client, userdata, sock):
+        # publish() may be called from executor threads
+        self._call_in_loop(self._loop.add_writer, sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self._call_in_loop(self._loop.remove_writer, sock)
+
+    def _call_in_loop(self, callback, *args):
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    async def _misc_loop(self):
+        """Keepalive pings and retries (what loop_start's thread used to do)"""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                break
+
+    # ================= CALLBACKS =================
+
+    def on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            print("MQTT connected")
+            client.publish("status/client", "online", qos=1, retain=False)
+
+            # Resubscribe
+            for topic in self.topic_handlers:
+                client.subscribe(topic, qos=1)
+                print(f"Resubscribed: {topic}")
+        else:
+            print(f"MQTT connect failed rc={rc}")
+
+    def on_disconnect(self, client, userdata, rc):
+        if rc != 0:
+            print("MQTT disconnected unexpectedly – auto reconnecting")
+            if not self._stopping and (self._reconnect_task is None or self._reconnect_task.done()):
+                self._reconnect_task = self._loop.create_task(self._reconnect())
+        else:
+            print("MQTT disconnected normally")
+
+    def on_message(self, client, userdata, msg):
+        payload = msg.payload.decode()
+        print(f"{msg.topic}: {payload}")
+
+        handler = self.topic_handlers.get(msg.topic)
+        if handler:
+            key = self.queue_key(msg.topic, payload)
+            self._pending[key] = self._pending.get(key, 0) + 1
+            self._loop.create_task(self._handle(key, msg.topic, handler, payload, time.monotonic()))
+
+    # ================= DISPATCH =================
+
+    async def _handle(self, key, topic, handler, payload, enqueued_at):
+        lock = self._key_locks.setdefault(key, asyncio.Lock())
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, so one key keeps message order
+            async with lock, self._semaphore:
+                started_at = time.monotonic()
+                try:
+                    if inspect.iscoroutinefunction(handler):
+                        await handler(payload)
+                    else:
+                        await self._loop.run_in_executor(self.executor, handler, payload)
+                    failed = False
+                except Exception as e:
+                    failed = True
+                    print(f"MQTT handler error on {topic}: {e}")
+                finished_at = time.monotonic()
+
+                metrics = self._topic_metrics(topic)
+                metrics["handled"] += 1
+                metrics["errors"] += failed
+                metrics["total_latency"] += finished_at - started_at
+                metrics["max_latency"] = max(metrics["max_latency"], finished_at - started_at)
+                metrics["total_wait"] += started_at - enqueued_at
+        finally:
+            self._pending[key] -= 1
+            if not self._pending[key]:
+                # Last message of this key: drop its lock
+                del self._pending[key]
+                del self._key_locks[key]
+
+    def _topic_metrics(self, topic):
+        return self._metrics.setdefault(topic, {
+            "handled": 0, "errors": 0,
+            "total_latency": 0.0, "max_latency": 0.0, "total_wait": 0.0,
+        })
+
+    async def _reconnect(self):
+        delay = self._min_delay
+        while not self._stopping and not self.client.is_connected():
+            await asyncio.sleep(delay)
+            try:
+                self.client.reconnect()
+                return
+            except OSError as e:
+                print(f"MQTT reconnect failed: {e}")
+                delay = min(delay * 2, self._max_delay)
+
+    # ================= PUBLIC API =================
+
+    async def connect(self):
+        print(f"Connecting to MQTT {self.broker}:{self.port}")
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._stopping = False
+        self.client.connect(self.broker, self.port, keepalive=120)
+
+    async def disconnect(self):
+        self._stopping = True
+        self.client.publish("status/client", "offline", qos=1, retain=False)
+        await asyncio.sleep(0.2)
+        self.client.disconnect()
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        self.executor.shutdown(wait=False)
+
+    def subscribe(self, topic, handler):
+        self.topic_handlers[topic] = handler
+        if self.client.is_connected():
+            self.client.subscribe(topic, qos=1)
+            print(f"Subscribed: {topic}")
+
+    def publish(self, topic, message, qos=0):
+        if not self.client.is_connected():
+            return False
+        self.client.publish(topic, message, qos=qos)
+        return True
+
+    def is_connected(self):
+        return self.client.is_connected()
+
+    def stats(self):
+        """Pending messages and handler latency metrics (same shape as MQTTService)"""
+        topics = {}
+        for topic, metrics in list(self._metrics.items()):
+            handled = metrics["handled"] or 1
+            topics[topic] = {
+                "handled": metrics["handled"],
+                "errors": metrics["errors"],
+                "avg_latency_ms": round(metrics["total_latency"] / handled * 1000, 1),
+                "max_latency_ms": round(metrics["max_latency"] * 1000, 1),
+                "avg_wait_ms": round(metrics["total_wait"] / handled * 1000, 1),
+            }
+        queues = dict(self._pending)
+        return {
+            "queue_depth": sum(queues.values()),
+            "queues": queues,
+            "topics": topics,
+        }
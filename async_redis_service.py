@@ -0,0 +1,212 @@
+import redis.asyncio as redis
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+
+
+class AsyncRedisService:
+    """asyncio counterpart of RedisService (same methods, awaitable)"""
+
+    _instance = None  # singleton (dùng chung connection)
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        db: int = 0,
+        password: Optional[str] = None,
+        decode_responses: bool = True,
+        max_connections: int = 20,
+        pool_timeout: float = 5.0,
+        socket_timeout: float = 5.0,
+        socket_connect_timeout: float = 3.0,
+        retries: int = 3,
+        backoff_base: float = 0.05,
+        backoff_cap: float = 1.0,
+    ):
+        if hasattr(self, "_initialized"):
+            return
+
+        connection_kwargs = dict(
+            host=host,
+            port=port,
+            db=db,
+            password=password,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_connect_timeout,
+            # retry lỗi mạng / timeout với exponential backoff
+            retry=Retry(ExponentialBackoff(cap=backoff_cap, base=backoff_base), retries),
+            retry_on_error=[ConnectionError, TimeoutError],
+            health_check_interval=30,
+        )
+
+        # pool giới hạn số connection, chờ tối đa pool_timeout khi hết connection
+        self.pool = redis.BlockingConnectionPool(
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            decode_responses=decode_responses,
+            **connection_kwargs,
+        )
+        self.client = redis.Redis(connection_pool=self.pool)
+
+        # client không decode, dùng cho dữ liệu nhị phân (embedding float32)
+        self.raw_pool = redis.BlockingConnectionPool(
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            decode_responses=False,
+            **connection_kwargs,
+        )
+        self.raw_client = redis.Redis(connection_pool=self.raw_pool)
+
+        # không ping ở đây (constructor không async): gọi await ping() khi khởi động
+        self._initialized = True
+
+    async def close(self):
+        await self.client.aclose()
+        await self.raw_client.aclose()
+
+    # ---------- BASIC ----------
+    async def set(self, key: str, value: Any, ex: Optional[int] = None):
+        """Set key with optional TTL (seconds)"""
+        return await self.client.set(name=key, value=value, ex=ex)
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def delete(self, key: str):
+        return await self.client.delete(key)
+
+    async def exists(self, key: str) -> bool:
+        return await self.client.exists(key) == 1
+
+    async def rename(self, key: str, new_key: str):
+        return await self.client.rename(key, new_key)
+
+    # ---------- BATCH ----------
+    async def mget(self, keys: List[str]) -> list:
+        """Get many keys in one round trip"""
+        return await self.client.mget(keys)
+
+    async def mset(self, mapping: Dict[str, Any]):
+        """Set many keys in one round trip"""
+        return await self.client.mset(mapping)
+
+    async def scan_iter(self, match: Optional[str] = None, count: int = 1000) -> AsyncIterator[str]:
+        """Iterate keys matching a pattern (SCAN, non-blocking for the server)"""
+        async for key in self.client.scan_iter(match=match, count=count):
+            yield key
+
+    async def get_many(self, match: str, count: int = 1000) -> Dict[str, Any]:
+        """Bulk read of every key matching a pattern: SCAN + one MGET per batch"""
+        result = {}
+        batch = []
+        async for key in self.client.scan_iter(match=match, count=count):
+            batch.append(key)
+            if len(batch) >= count:
+                result.update(zip(batch, await self.client.mget(batch)))
+                batch = []
+        if batch:
+            result.update(zip(batch, await self.client.mget(batch)))
+        return result
+
+    async def hgetall_many(self, names: Iterable[str]) -> Dict[str, dict]:
+        """HGETALL of several hashes in one round trip"""
+        names = list(names)
+        async with self.pipeline() as pipe:
+            for name in names:
+                pipe.hgetall(name)
+            return dict(zip(names, await pipe.execute()))
+
+    # ---------- PIPELINE ----------
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False, raw: bool = False):
+        """
+        Queue commands and send them in one round trip
+
+        Commands still queued when the block exits are executed then; call
+        await pipe.execute() inside the block to get the results.
+
+        Args:
+            transaction: Wrap the commands in MULTI/EXEC
+            raw: Use the binary (non-decoding) client
+        """
+        pipe = (self.raw_client if raw else self.client).pipeline(transaction=transaction)
+        try:
+            yield pipe
+            if len(pipe):
+                await pipe.execute()
+        finally:
+            await pipe.reset()
+
+    # ---------- HASH ----------
+    async def hset(self, name: str, mapping: dict):
+        return await self.client.hset(name, mapping=mapping)
+
+    async def hgetall(self, name: str) -> dict:
+        return await self.client.hgetall(name)
+
+    async def hget(self, name: str, key: str):
+        return await self.client.hget(name, key)
+
+    async def hmget(self, name: str, keys: List[str]) -> list:
+        """Get several fields of a hash in one round trip"""
+        return await self.client.hmget(name, keys)
+
+    async def hdel(self, name: str, *keys):
+        return await self.client.hdel(name, *keys)
+
+    # ---------- BINARY HASH ----------
+    async def hset_bytes(self, name: str, mapping: dict):
+        """HSET with raw bytes values"""
+        return await self.raw_client.hset(name, mapping=mapping)
+
+    async def hscan_bytes(self, name: str, count: int = 1000):
+        """Iterate (field, value) of a hash as raw bytes, in HSCAN batches"""
+        async for item in self.raw_client.hscan_iter(name, count=count):
+            yield item
+
+    # ---------- LIST / QUEUE ----------
+    async def lpush(self, key: str, value: Any):
+        return await self.client.lpush(key, value)
+
+    async def rpush(self, key: str, value: Any):
+        return await self.client.rpush(key, value)
+
+    async def lpop(self, key: str):
+        return await self.client.lpop(key)
+
+    # ---------- SET ----------
+    async def sadd(self, key: str, *values):
+        return await self.client.sadd(key, *values)
+
+    async def smembers(self, key: str):
+        return await self.client.smembers(key)
+
+    # ---------- SORTED SET ----------
+    async def zcard(self, key: str) -> int:
+        return await self.client.zcard(key)
+
+    # ---------- SCRIPT ----------
+    def register_script(self, script: str):
+        """Lua script callable as await script(keys=[...], args=[...]) (EVALSHA, atomic)"""
+        return self.client.register_script(script)
+
+    # ---------- PUB / SUB ----------
+    async def publish(self, channel: str, message: str):
+        return await self.client.publish(channel, message)
+
+    async def subscribe(self, channel: str):
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(channel)
+        return pubsub
+
+    # ---------- UTILS ----------
+    async def ping(self) -> bool:
+        return await self.client.ping()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Face Detector Benchmark
+Report detection ms per frame for each detector backend and scale
+at 640x480 and 1280x720
+"""
+
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from face_detectors import HaarDetector, MTCNNDetector, SSDDetector, ScaledDetector, YuNetDetector
+
+RESOLUTIONS = [(640, 480), (1280, 720)]
+
+
+def make_frame(image, width, height):
+    """Gray canvas with the test image pasted in the middle at 1/3 frame height"""
+    frame = np.full((height, width, 3), 128, dtype=np.uint8)
+    face_height = height // 3
+    face_width = int(image.shape[1] * face_height / image.shape[0])
+    face = cv2.resize(image, (face_width, face_height))
+    top = (height - face_height) // 2
+    left = (width - face_width) // 2
+    frame[top:top + face_height, left:left + face_width] = face
+    return frame
+
+
+def build_detector(backend, args):
+    if backend == "mtcnn":
+        return MTCNNDetector()
+    if backend == "yunet":
+        return YuNetDetector(args.yunet_model)
+    if backend == "ssd":
+        return SSDDetector(args.ssd_model)
+    if backend == "haar":
+        return HaarDetector()
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def time_detector(detector, frame, frames):
+    """Return (ms per frame, faces found on the last frame)"""
+    detector.detect(frame)  # warm-up
+    start = time.perf_counter()
+    for _ in range(frames):
+        detections = detector.detect(frame)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / frames, len(detections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detector backends")
+    parser.add_argument("--image", default="test.png", help="Image containing a face")
+    parser.add_argument("--backends", nargs="+", default=["mtcnn", "yunet", "ssd", "haar"])
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.5])
+    parser.add_argument("--frames", type=int, default=20, help="Timed frames per run")
+    parser.add_argument("--yunet-model", default="models/face_detection_yunet_2023mar.onnx")
+    parser.add_argument("--ssd-model", default="models/res10_300x300_ssd_iter_140000.caffemodel")
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    if image is None:
+        print(f"Cannot read image {args.image}")
+        return 1
+
+    print("=" * 60)
+    print(f"{'backend':<10}{'scale':>8}{'resolution':>14}{'ms/frame':>12}{'faces':>8}")
+    for backend in args.backends:
+        try:
+            detector = build_detector(backend, args)
+        except Exception as e:
+            print(f"{backend:<10} unavailable: {e}")
+            continue
+
+        for scale in args.scales:
+            scaled = ScaledDetector(detector, scale)
+            for width, height in RESOLUTIONS:
+                ms, faces = time_detector(scaled, make_frame(image, width, height), args.frames)
+                print(f"{backend:<10}{scale:>8.2f}{f'{width}x{height}':>14}{ms:>12.2f}{faces:>8}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Face Embedder Benchmark
+Compare Keras and ONNX Runtime FaceNet: load time, peak RSS, ms per face at
+batch size 1 and 16, and cosine distance of the embeddings to Keras
+
+Each engine runs in its own subprocess so memory is measured in isolation
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from export_facenet_onnx import cosine_distances, sample_faces
+from face_embedders import create_embedder
+
+
+def run_worker(args):
+    """Measure one engine, print a JSON line and save its embeddings"""
+    faces = sample_faces(args.image)
+
+    started_at = time.perf_counter()
+    embedder = create_embedder(args.backend, model_path=args.model)
+    embedder.embeddings(faces[:1])  # warm-up
+    load_seconds = time.perf_counter() - started_at
+
+    result = {"engine": embedder.name, "load_s": round(load_seconds, 2)}
+    for batch_size in (1, 16):
+        batch = faces[:batch_size]
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            embedder.embeddings(batch)
+        elapsed = time.perf_counter() - start
+        result[f"ms_per_face_b{batch_size}"] = round(elapsed * 1000 / (args.repeat * batch_size), 2)
+
+    np.save(args.save, embedder.embeddings(faces))
+    # ru_maxrss is in KB on Linux
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FaceNet embedding engines")
+    parser.add_argument("--image", default="test.png")
+    parser.add_argument("--models", nargs="*", default=["models/facenet.onnx", "models/facenet-int8.onnx"],
+                        help="ONNX models compared against Keras")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", default="keras", help=argparse.SUPPRESS)
+    parser.add_argument("--model", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--save", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return 0
+
+    runs = [("keras", None)] + [("onnx", model) for model in args.models if os.path.exists(model)]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (backend, model) in enumerate(runs):
+            save_path = os.path.join(tmp, f"{i}.npy")
+            command = [sys.executable, __file__, "--worker", "--backend", backend,
+                       "--image", args.image, "--repeat", str(args.repeat), "--save", save_path]
+            if model:
+                command += ["--model", model]
+            output = subprocess.run(command, capture_output=True, text=True)
+            if output.returncode != 0:
+                print(f"{backend} {model or ''} failed:\n{output.stderr.strip()}")
+                continue
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            result["label"] = os.path.basename(model) if model else "keras"
+            result["embeddings"] = np.load(save_path)
+            results.append(result)
+
+    reference = next((r["embeddings"] for r in results if r["engine"] == "keras"), None)
+
+    print("=" * 86)
+    print(f"{'engine':<22}{'load s':>8}{'RSS MB':>9}{'ms/face b1':>12}{'ms/face b16':>13}"
+          f"{'mean dist':>11}{'max dist':>11}")
+    for r in results:
+        if reference is not None:
+            distance = cosine_distances(reference, r["embeddings"])
+            mean_distance, max_distance = f"{distance.mean():.5f}", f"{distance.max():.5f}"
+        else:
+            mean_distance = max_distance = "-"
+        print(f"{r['label']:<22}{r['load_s']:>8}{r['peak_rss_mb']:>9}{r['ms_per_face_b1']:>12}"
+              f"{r['ms_per_face_b16']:>13}{mean_distance:>11}{max_distance:>11}")
+    print("=" * 86)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Face Index Benchmark
+Compare exact FlatIndex search with approximate IVFIndex search
+(recall@1 and query latency) on a synthetic face gallery
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from face_gallery import normalize_encodings
+from face_index import FlatIndex, IVFIndex
+
+
+def make_gallery(size, dimension, rng):
+    """Synthetic identities: unit vectors around a few hundred 'population' modes"""
+    modes = normalize_encodings(rng.standard_normal((256, dimension)))
+    encodings = modes[rng.integers(0, len(modes), size)] + 0.6 * rng.standard_normal((size, dimension))
+    return normalize_encodings(encodings)
+
+
+def make_queries(gallery, count, noise, rng):
+    """Noisy re-captures of random known identities"""
+    truth = rng.integers(0, len(gallery), count)
+    queries = gallery[truth] + noise * rng.standard_normal((count, gallery.shape[1]))
+    return normalize_encodings(queries), truth
+
+
+def time_search(index, queries, batch_size):
+    """Return (ms per query, nearest id per query)"""
+    found = []
+    start = time.perf_counter()
+    for offset in range(0, len(queries), batch_size):
+        _, ids = index.search(queries[offset:offset + batch_size], k=1)
+        found.extend(row[0] if row else None for row in ids)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / len(queries), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face index backends")
+    parser.add_argument("--size", type=int, default=50000, help="Gallery size")
+    parser.add_argument("--dimension", type=int, default=512, help="Encoding size")
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries")
+    parser.add_argument("--batch-size", type=int, default=1, help="Queries per search call")
+    parser.add_argument("--noise", type=float, default=0.02, help="Query noise level")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF clusters (default sqrt(size))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32],
+                        help="IVF nprobe values to test")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"Building synthetic gallery: {args.size} x {args.dimension}")
+    encodings = make_gallery(args.size, args.dimension, rng)
+    ids = list(range(args.size))
+    queries, truth = make_queries(encodings, args.queries, args.noise, rng)
+
+    flat = FlatIndex(args.dimension)
+    flat.add_many(ids, encodings)
+    flat_ms, exact = time_search(flat, queries, args.batch_size)
+    exact_recall = np.mean([found == expected for found, expected in zip(exact, truth)])
+
+    ivf = IVFIndex(args.dimension, nlist=args.nlist, train_threshold=args.size + 1)
+    ivf.add_many(ids, encodings)
+    start = time.perf_counter()
+    ivf.train()
+    train_s = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"{'backend':<20}{'ms/query':>12}{'recall@1':>12}{'speedup':>12}")
+    print(f"{'flat':<20}{flat_ms:>12.3f}{exact_recall:>12.3f}{1.0:>12.2f}")
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        ivf_ms, approx = time_search(ivf, queries, args.batch_size)
+        # Recall against exact search, so it measures the index and not the data
+        recall = np.mean([found == expected for found, expected in zip(approx, exact)])
+        print(f"{f'ivf nprobe={nprobe}':<20}{ivf_ms:>12.3f}{recall:>12.3f}{flat_ms / ivf_ms:>12.2f}")
+    print("=" * 60)
+    print(f"IVF training: {train_s:.2f}s for {args.nlist or int(np.sqrt(args.size))} clusters")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""
+Camera Reader - One background capture per camera
+Keeps a ring buffer of the latest timestamped frames so any number of
+consumers can read the newest frame without opening their own connection
+
+MJPEGCameraReader reads an HTTP MJPEG stream (ESP32-CAM) itself: the
+original JPEG bytes are kept so they can be forwarded untouched, and a
+frame is only decoded when a consumer asks for it
+"""
+import threading
+import time
+import urllib.request
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+# cv2.imdecode flag for each supported decode scale
+_DECODE_FLAGS = {
+    1.0: cv2.IMREAD_COLOR,
+    0.5: cv2.IMREAD_REDUCED_COLOR_2,
+    0.25: cv2.IMREAD_REDUCED_COLOR_4,
+    0.125: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class CameraReader:
+    # Decoded frame size relative to the camera resolution
+    frame_scale = 1.0
+    # True if the original JPEG bytes are available (wait_for_jpeg)
+    supports_jpeg = False
+
+    def __init__(self, camera_url, buffer_size=30, reconnect_delay=1.0):
+        """
+        Initialize camera reader
+
+        Args:
+            camera_url: OpenCV source (device index or stream URL)
+            buffer_size: Number of latest frames kept in the ring buffer
+            reconnect_delay: Seconds to wait before reopening a failed capture
+        """
+        self.camera_url = camera_url
+        self.reconnect_delay = reconnect_delay
+
+        # Ring buffer of (seq, timestamp, frame), newest last
+        self._frames = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    # ================= LIFECYCLE =================
+
+    def start(self):
+        """Start the capture thread (no-op if already running)"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"camera-{self.camera_url}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self):
+        return self._running
+
+    # ================= PUBLIC API =================
+
+    def latest(self):
+        """
+        Newest frame without blocking
+
+        Frames are shared between consumers: copy before drawing on them.
+
+        Returns:
+            Tuple (seq, timestamp, frame) or None if no frame yet
+        """
+        with self._condition:
+            entry = self._frames[-1] if self._frames else None
+        return self._frame_entry(entry) if entry is not None else None
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """
+        Block until a frame newer than after_seq is available
+
+        Args:
+            after_seq: Sequence number of the last frame the caller has seen
+            timeout: Maximum seconds to wait (None = forever)
+
+        Returns:
+            Tuple (seq, timestamp, frame) or None on timeout / stop
+        """
+        entry = self._wait_for_entry(after_seq, timeout)
+        return self._frame_entry(entry) if entry is not None else None
+
+    @property
+    def last_seq(self):
+        """Sequence number of the newest buffered frame (0 if none yet)"""
+        with self._condition:
+            return self._frames[-1][0] if self._frames else 0
+
+    def recent(self, count=None, since=None):
+        """
+        Latest frames in the buffer, oldest first
+
+        Args:
+            count: Max frames (newest ones)
+            since: Skip frames captured before this time.time() timestamp,
+                before they are decoded
+
+        Returns:
+            List of (seq, timestamp, frame)
+        """
+        with self._condition:
+            entries = list(self._frames)
+        if count is not None:
+            entries = entries[-count:]
+        if since is not None:
+            entries = [entry for entry in entries if entry[1] >= since]
+        frames = [self._frame_entry(entry) for entry in entries]
+        return [frame for frame in frames if frame is not None]
+
+    def stats(self):
+        return {"source": str(self.camera_url), "frames": self._seq}
+
+    def _wait_for_entry(self, after_seq, timeout):
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not self._running or (self._frames and self._frames[-1][0] > after_seq),
+                timeout)
+            if self._frames and self._frames[-1][0] > after_seq:
+                return self._frames[-1]
+            return None
+
+    def _frame_entry(self, entry):
+        """Buffered entry -> (seq, timestamp, frame), None if it cannot be decoded"""
+        return entry
+
+    def _append(self, item):
+        with self._condition:
+            self._seq += 1
+            self._frames.append((self._seq, time.time(), item))
+            self._condition.notify_all()
+
+    # ================= WORKER =================
+
+    def _run(self):
+        cap = None
+        while self._running:
+            if cap is None:
+                cap = cv2.VideoCapture(self.camera_url)
+                if not cap.isOpened():
+                    print(f"[Warning] Cannot connect to camera {self.camera_url} — retrying...")
+                    cap.release()
+                    cap = None
+                    time.sleep(self.reconnect_delay)
+                    continue
+                print(f"Camera {self.camera_url} connected")
+
+            ret, frame = cap.read()
+            if not ret or frame is None:
+                print("[Warning] Cannot read frame — reconnecting...")
+                cap.release()
+                cap = None
+                time.sleep(self.reconnect_delay)
+                continue
+
+            self._append(frame)
+
+        if cap is not None:
+            cap.release()
+
+
+class MJPEGCameraReader(CameraReader):
+    supports_jpeg = True
+
+    def __init__(self, camera_url, buffer_size=30, reconnect_delay=1.0, decode_scale=1.0,
+                 read_timeout=10):
+        """
+        Initialize MJPEG reader
+
+        Args:
+            camera_url: HTTP multipart MJPEG stream URL (ESP32-CAM /stream)
+            buffer_size: Number of latest JPEG frames kept in the ring buffer
+            reconnect_delay: Seconds to wait before reopening a failed stream
+            decode_scale: Decode at reduced size, 1.0, 0.5, 0.25 or 0.125
+                (libjpeg scaled decoding, much cheaper than decode + resize)
+            read_timeout: Socket timeout in seconds
+        """
+        if decode_scale not in _DECODE_FLAGS:
+            raise ValueError(f"decode_scale must be one of {sorted(_DECODE_FLAGS)}")
+        super().__init__(camera_url, buffer_size, reconnect_delay)
+        self.frame_scale = decode_scale
+        self.read_timeout = read_timeout
+        self._decode_flag = _DECODE_FLAGS[decode_scale]
+
+        # Small cache so consumers reading the same frame decode it once
+        self._decoded = OrderedDict()
+        self._decode_lock = threading.Lock()
+        self._decode_count = 0
+        self._bytes = 0
+
+    def wait_for_jpeg(self, after_seq=0, timeout=None):
+        """
+        Same as wait_for_frame, but returns the original JPEG bytes
+
+        Returns:
+            Tuple (seq, timestamp, jpeg) or None on timeout / stop
+        """
+        return self._wait_for_entry(after_seq, timeout)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            "passthrough": True,
+            "decoded": self._decode_count,
+            "decode_scale": self.frame_scale,
+            "avg_frame_kb": round(self._bytes / self._seq / 1024, 1) if self._seq else 0,
+        })
+        return stats
+
+    def _frame_entry(self, entry):
+        seq, timestamp, jpeg = entry
+        with self._decode_lock:
+            frame = self._decoded.get(seq)
+            if frame is None:
+                frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), self._decode_flag)
+                if frame is None:
+                    print(f"[Warning] Cannot decode frame {seq} from {self.camera_url}")
+                    return None
+                self._decode_count += 1
+                self._decoded[seq] = frame
+                if len(self._decoded) > 4:
+                    self._decoded.popitem(last=False)
+        return seq, timestamp, frame
+
+    def _run(self):
+        while self._running:
+            try:
+                with urllib.request.urlopen(self.camera_url, timeout=self.read_timeout) as response:
+                    boundary = _boundary(response.headers.get("Content-Type", ""))
+                    print(f"Camera {self.camera_url} connected (MJPEG pass-through)")
+                    for jpeg in _read_parts(response, boundary):
+                        if not self._running:
+                            break
+                        self._bytes += len(jpeg)
+                        self._append(jpeg)
+            except (OSError, ValueError) as e:
+                print(f"[Warning] Camera stream {self.camera_url} error: {e} — reconnecting...")
+            if self._running:
+                time.sleep(self.reconnect_delay)
+
+
+def _boundary(content_type):
+    """Boundary of a multipart Content-Type header"""
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "boundary":
+            return value.strip('"').encode()
+    raise ValueError(f"Not a multipart stream: {content_type!r}")
+
+
+def _read_parts(stream, boundary):
+    """
+    Yield the body of each part of a multipart stream
+
+    Parts with a Content-Length header (ESP32-CAM) are read in one call,
+    others up to the next boundary line.
+    """
+    delimiter = b"--" + boundary
+    line = stream.readline()
+    while line:
+        # Skip to the next boundary line
+        if not line.startswith(delimiter):
+            line = stream.readline()
+            continue
+        if line.strip() == delimiter + b"--":
+            return
+
+        headers = {}
+        while True:
+            line = stream.readline()
+            if not line:
+                return
+            line = line.strip()
+            if not line:
+                break
+            name, _, value = line.partition(b":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = headers.get(b"content-length")
+        if length is not None:
+            body = stream.read(int(length))
+            if len(body) < int(length):
+                return
+            yield body
+            line = stream.readline()
+        else:
+            chunks = []
+            line = stream.readline()
+            while line and not line.startswith(delimiter):
+                chunks.append(line)
+                line = stream.readline()
+            body = b"".join(chunks)
+            yield body[:-2] if body.endswith(b"\r\n") else body
+
+
+def create_camera_reader(camera_url, passthrough=True, decode_scale=1.0, **kwargs):
+    """
+    Build the reader for a camera source
+
+    Args:
+        camera_url: Device index or stream URL
+        passthrough: Read http:// MJPEG streams with MJPEGCameraReader (keeps
+            the original JPEG bytes); other sources use OpenCV VideoCapture
+        decode_scale: Decode scale for MJPEGCameraReader
+        **kwargs: Extra CameraReader options (buffer_size, reconnect_delay)
+
+    Returns:
+        CameraReader instance
+    """
+    if passthrough and isinstance(camera_url, str) and camera_url.startswith(("http://", "https://")):
+        return MJPEGCameraReader(camera_url, decode_scale=decode_scale, **kwargs)
+    return CameraReader(camera_url, **kwargs)
@@ -0,0 +1,140 @@
+"""
+Camera Registry - Cameras by id and by the doors they watch
+Each camera has its own capture reader, stream pipeline and stream
+encoders; all of them share one inference backend
+"""
+
+
+class Camera:
+    def __init__(self, camera_id, reader, doors=(), pipeline=None, encoder=None, raw_encoder=None):
+        """
+        Initialize camera
+
+        Args:
+            camera_id: Registry id (used in /stream/<camera_id>)
+            reader: CameraReader of this camera
+            doors: Doors (locker column) this camera faces
+            pipeline: StreamPipeline analysing this camera
+            encoder: StreamEncoder for the annotated stream
+            raw_encoder: StreamEncoder for the raw stream
+        """
+        self.camera_id = camera_id
+        self.reader = reader
+        self.doors = list(doors)
+        self.pipeline = pipeline
+        self.encoder = encoder
+        self.raw_encoder = raw_encoder
+
+    def start(self):
+        """Start the capture (no-op if already running)"""
+        self.reader.start()
+
+    def stream(self, raw=False):
+        """
+        Multipart chunk generator for one viewer
+
+        Args:
+            raw: Camera frames without face boxes
+        """
+        self.reader.start()
+        if raw:
+            self.raw_encoder.start()
+            return self.raw_encoder.frames()
+
+        self.pipeline.start()
+        self.encoder.start()
+        return self._watch(self.encoder.frames())
+
+    def _watch(self, chunks):
+        """Keep the pipeline analysing while this viewer is connected"""
+        self.pipeline.add_viewer()
+        try:
+            yield from chunks
+        finally:
+            self.pipeline.remove_viewer()
+
+    def stop(self):
+        for worker in (self.encoder, self.raw_encoder, self.pipeline, self.reader):
+            if worker is not None:
+                worker.stop()
+
+    def stats(self):
+        return {
+            "doors": self.doors,
+            "camera": self.reader.stats(),
+            "stream": self.pipeline.stats() if self.pipeline else None,
+            "stream_output": self.encoder.stats() if self.encoder else None,
+        }
+
+
+class CameraRegistry:
+    def __init__(self, default_camera_id=None):
+        """
+        Initialize an empty registry
+
+        Args:
+            default_camera_id: Camera used when a request names no known
+                camera or door (default: the first camera added)
+        """
+        self.default_camera_id = default_camera_id
+        self._cameras = {}
+        self._camera_of_door = {}
+
+    def __len__(self):
+        return len(self._cameras)
+
+    def __iter__(self):
+        return iter(self._cameras.values())
+
+    def __contains__(self, camera_id):
+        return camera_id in self._cameras
+
+    @property
+    def ids(self):
+        return list(self._cameras)
+
+    def add(self, camera):
+        """Register a camera and the doors it faces"""
+        if camera.camera_id in self._cameras:
+            raise ValueError(f"Duplicate camera id: {camera.camera_id}")
+        for door in camera.doors:
+            if door in self._camera_of_door:
+                raise ValueError(f"Door {door} already assigned to camera {self._camera_of_door[door]}")
+            self._camera_of_door[door] = camera.camera_id
+        self._cameras[camera.camera_id] = camera
+        if self.default_camera_id is None:
+            self.default_camera_id = camera.camera_id
+
+    def get(self, camera_id):
+        """Camera by id (KeyError if unknown)"""
+        return self._cameras[camera_id]
+
+    @property
+    def default(self):
+        return self._cameras[self.default_camera_id]
+
+    def for_door(self, door):
+        """Camera facing door, or the default camera"""
+        camera_id = self._camera_of_door.get(door)
+        return self._cameras[camera_id] if camera_id is not None else self.default
+
+    def route(self, camera_id=None, door=None):
+        """
+        Camera for a request: explicit camera id first, then the requesting
+        door, then the default camera
+        """
+        if camera_id in self._cameras:
+            return self._cameras[camera_id]
+        return self.for_door(door)
+
+    def start(self):
+        """Start every capture"""
+        for camera in self:
+            camera.start()
+
+    def stop(self):
+        for camera in self:
+            camera.stop()
+
+    def stats(self):
+        return {camera.camera_id: camera.stats() for camera in self}
@@ -0,0 +1,172 @@
+"""
+Detection Gate - Skip face detection on an unchanged scene
+A running-average background of a small grayscale frame tells whether
+anything moved since the last detection; while nothing did, the previous
+detection result still holds. An optional region-of-interest polygon limits
+both the motion check and face detection to the area in front of the lockers.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class DetectionGate:
+    def __init__(self, roi=None, motion=True, width=160, pixel_threshold=25,
+                 min_changed_fraction=0.002, background_alpha=0.05, refresh_interval=2.0,
+                 idle_fps=5):
+        """
+        Initialize gate
+
+        Args:
+            roi: Optional polygon [(x, y), ...] in fractions of the frame
+                size (0..1); faces and motion outside it are ignored
+            motion: Skip detections while nothing moves (False = ROI only)
+            width: Width of the grayscale frame used for the motion check
+            pixel_threshold: Gray level difference counted as a changed pixel
+            min_changed_fraction: Fraction of (ROI) pixels that must change
+                to count as motion
+            background_alpha: Background update rate (higher = a still
+                scene is absorbed faster)
+            refresh_interval: Max seconds between detections even without
+                motion (0 = never forced)
+            idle_fps: Frames per second looked at while the scene is idle
+                (0 = every frame)
+        """
+        self.roi = np.asarray(roi, dtype=np.float32) if roi is not None else None
+        self.motion = motion
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.background_alpha = background_alpha
+        self.refresh_interval = refresh_interval
+        self.idle_interval = 1.0 / idle_fps if idle_fps else 0.0
+
+        self._background = None
+        self._masks = {}
+        self._mask_areas = {}
+        self._pending = True
+        self._last_detection = 0.0
+        self._lock = threading.Lock()
+
+        self._frames = 0
+        self._motion_frames = 0
+        self._detections = 0
+        self._skipped = 0
+
+    @property
+    def idle(self):
+        """True while nothing moved since the last detection"""
+        return self.motion and not self._pending
+
+    def update(self, frame):
+        """
+        Feed one frame to the background model (call for every analysed frame)
+
+        Returns:
+            True if the frame differs from the background
+        """
+        if not self.motion:
+            return True
+        small = self._small_gray(frame)
+        with self._lock:
+            self._frames += 1
+            if self._background is None or self._background.shape != small.shape:
+                self._background = small.astype(np.float32)
+                self._pending = True
+                return True
+
+            changed = cv2.absdiff(small, cv2.convertScaleAbs(self._background)) > self.pixel_threshold
+            area = changed.size
+            mask = self._mask(small.shape)
+            if mask is not None:
+                changed &= mask
+                area = max(1, self._mask_areas[small.shape])
+            cv2.accumulateWeighted(small, self._background, self.background_alpha)
+
+            motion = np.count_nonzero(changed) >= self.min_changed_fraction * area
+            if motion:
+                self._motion_frames += 1
+                self._pending = True
+            return motion
+
+    def should_detect(self):
+        """
+        Whether a due detection has to run: motion since the last detection,
+        or refresh_interval elapsed. Counts skipped detections.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self.motion or self._pending or (self.refresh_interval and now - self._last_detection >= self.refresh_interval):
+                self._pending = False
+                self._last_detection = now
+                self._detections += 1
+                return True
+            self._skipped += 1
+            return False
+
+    def detect(self, frame, detect_faces):
+        """
+        Run detect_faces on the ROI only
+
+        Args:
+            frame: Full BGR frame
+            detect_faces: Callable frame -> [(top, right, bottom, left), ...]
+
+        Returns:
+            Face locations in full-frame coordinates whose center lies in the ROI
+        """
+        if self.roi is None:
+            return detect_faces(frame)
+
+        polygon = self._polygon(frame.shape)
+        left, top, roi_width, roi_height = cv2.boundingRect(polygon)
+        if roi_width == 0 or roi_height == 0:
+            return []
+        face_locations = detect_faces(frame[top:top + roi_height, left:left + roi_width])
+
+        results = []
+        for face_top, face_right, face_bottom, face_left in face_locations:
+            box = (face_top + top, face_right + left, face_bottom + top, face_left + left)
+            center = ((box[1] + box[3]) / 2.0, (box[0] + box[2]) / 2.0)
+            if cv2.pointPolygonTest(polygon, center, False) >= 0:
+                results.append(box)
+        return results
+
+    def stats(self):
+        with self._lock:
+            due = self._detections + self._skipped
+            return {
+                "roi": self.roi is not None,
+                "frames": self._frames,
+                "motion_frames": self._motion_frames,
+                "detections": self._detections,
+                "skipped_detections": self._skipped,
+                "skip_rate": round(self._skipped / due, 3) if due else 0,
+                "idle": self.idle,
+            }
+
+    def _small_gray(self, frame):
+        height, width = frame.shape[:2]
+        small_height = max(1, height * self.width // width)
+        small = cv2.resize(frame, (self.width, small_height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        # Blur away sensor noise and JPEG artifacts
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def _polygon(self, shape):
+        """ROI polygon in pixels of a frame of this shape"""
+        height, width = shape[:2]
+        return np.round(self.roi * (width, height)).astype(np.int32)
+
+    def _mask(self, shape):
+        """Boolean ROI mask of the motion frame (cached per shape)"""
+        if self.roi is None:
+            return None
+        if shape not in self._masks:
+            mask = np.zeros(shape, dtype=np.uint8)
+            cv2.fillPoly(mask, [self._polygon(shape)], 1)
+            self._masks[shape] = mask.astype(bool)
+            self._mask_areas[shape] = int(np.count_nonzero(mask))
+        return self._masks[shape]
@@ -0,0 +1,208 @@
+"""
+Door Store - Indexed door state in Redis
+Besides the "data_door" hash (door -> JSON {"status", "user_id"}) it keeps
+a sorted set of free doors and a user_id -> door map. Claim / release /
+status updates run as Lua scripts, so each is one atomic round trip.
+AsyncDoorStore is the same store on AsyncRedisService
+"""
+
+# KEYS: data_door, free doors, user map  ARGV: user_id, status
+# Returns {door, 1} for a newly claimed door, {door, 0} if user_id already
+# holds one (left untouched), false if no door is free
+_CLAIM_SCRIPT = """
+local held = redis.call('HGET', KEYS[3], ARGV[1])
+if held then
+  return {held, 0}
+end
+local popped = redis.call('ZPOPMIN', KEYS[2])
+if #popped == 0 then
+  return false
+end
+local door = popped[1]
+redis.call('HSET', KEYS[1], door, cjson.encode({status = tonumber(ARGV[2]), user_id = tonumber(ARGV[1])}))
+redis.call('HSET', KEYS[3], ARGV[1], door)
+return {door, 1}
+"""
+
+# KEYS: data_door, free doors, user map  ARGV: door, status, door order
+_RELEASE_SCRIPT = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if raw then
+  local ok, data = pcall(cjson.decode, raw)
+  if ok and data.user_id ~= nil and data.user_id ~= cjson.null then
+    local user_id = tostring(data.user_id)
+    if redis.call('HGET', KEYS[3], user_id) == ARGV[1] then
+      redis.call('HDEL', KEYS[3], user_id)
+    end
+  end
+end
+redis.call('HSET', KEYS[1], ARGV[1], cjson.encode({status = tonumber(ARGV[2]), user_id = cjson.null}))
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+
+# KEYS: data_door  ARGV: door, status
+_UPDATE_STATUS_SCRIPT = """
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+if not raw then
+  return 0
+end
+local data = cjson.decode(raw)
+data.status = tonumber(ARGV[2])
+redis.call('HSET', KEYS[1], ARGV[1], cjson.encode(data))
+return 1
+"""
+
+# KEYS: data_door, free doors, user map  ARGV: doors in allocation order
+# A user holding several doors keeps the first one in the map, the others
+# are returned as conflicts: {free count, {door, ...}}
+_REBUILD_SCRIPT = """
+redis.call('DEL', KEYS[2], KEYS[3])
+local conflicts = {}
+for i, door in ipairs(ARGV) do
+  local raw = redis.call('HGET', KEYS[1], door)
+  if not raw then
+    redis.call('ZADD', KEYS[2], i, door)
+  else
+    local ok, data = pcall(cjson.decode, raw)
+    if ok then
+      if data.user_id == nil or data.user_id == cjson.null then
+        redis.call('ZADD', KEYS[2], i, door)
+      elseif redis.call('HSETNX', KEYS[3], tostring(data.user_id), door) == 0 then
+        table.insert(conflicts, door)
+      end
+    end
+  end
+end
+return {redis.call('ZCARD', KEYS[2]), conflicts}
+"""
+
+
+def _claim_result(result):
+    """Claim script reply -> (door, claimed)"""
+    if result is None:
+        return None, False
+    door, claimed = result
+    return door, claimed == 1
+
+
+class DoorStore:
+    def __init__(self, redis, doors, key="data_door"):
+        """
+        Initialize door store
+
+        Args:
+            redis: RedisService instance
+            doors: Door names, in allocation order (first = top)
+            key: Hash holding door -> JSON state
+        """
+        self.redis = redis
+        self.doors = list(doors)
+        self.key = key
+        self.free_key = f"{key}:free"
+        self.user_key = f"{key}:user"
+        self._order = {door: i + 1 for i, door in enumerate(self.doors)}
+
+        self._claim = redis.register_script(_CLAIM_SCRIPT)
+        self._release = redis.register_script(_RELEASE_SCRIPT)
+        self._update_status = redis.register_script(_UPDATE_STATUS_SCRIPT)
+        self._rebuild = redis.register_script(_REBUILD_SCRIPT)
+
+    def rebuild_index(self):
+        """
+        Rebuild free-door set and user map from the "data_door" hash
+
+        A user found on several doors is mapped to the first one (in
+        allocation order); the other doors are reported and left occupied.
+
+        Returns:
+            Number of free doors
+        """
+        result = self._rebuild(keys=[self.key, self.free_key, self.user_key], args=self.doors)
+        return self._rebuilt(result)
+
+    def _rebuilt(self, result):
+        free_count, conflicts = result
+        print(f"Door index rebuilt: {free_count}/{len(self.doors)} doors free")
+        if conflicts:
+            print(f"Warning: doors {', '.join(conflicts)} belong to a user that holds "
+                  f"an earlier door, they need to be emptied by hand")
+        return free_count
+
+    def has_free_door(self):
+        return self.redis.zcard(self.free_key) > 0
+
+    def claim(self, user_id, status):
+        """
+        Atomically take the first free door for user_id
+
+        A user that already holds a door never gets a second one.
+
+        Returns:
+            Tuple (door, claimed): claimed is False if door is the one
+            user_id already holds (its state is not changed). (None, False)
+            if all doors are occupied
+        """
+        return _claim_result(self._claim(keys=[self.key, self.free_key, self.user_key],
+                                         args=[user_id, status]))
+
+    def release(self, door, status):
+        """Atomically empty a door and put it back in the free set"""
+        self._release(keys=[self.key, self.free_key, self.user_key],
+                      args=[door, status, self._order[door]])
+
+    def update_status(self, door, status):
+        """
+        Atomically change the status of a door that has state
+
+        Returns:
+            True if the door was updated
+        """
+        return self._update_status(keys=[self.key], args=[door, status]) == 1
+
+    def find_by_user(self, user_id):
+        """Door assigned to user_id, or None"""
+        return self.redis.hget(self.user_key, str(user_id))
+
+    def all_doors(self):
+        """Raw "data_door" hash: door -> JSON state"""
+        return self.redis.hgetall(self.key)
+
+
+class AsyncDoorStore(DoorStore):
+    """asyncio counterpart of DoorStore (same methods, awaitable)"""
+
+    def __init__(self, redis, doors, key="data_door"):
+        """
+        Initialize door store
+
+        Args:
+            redis: AsyncRedisService instance
+            doors: Door names, in allocation order (first = top)
+            key: Hash holding door -> JSON state
+        """
+        super().__init__(redis, doors, key)
+
+    async def rebuild_index(self):
+        result = await self._rebuild(keys=[self.key, self.free_key, self.user_key], args=self.doors)
+        return self._rebuilt(result)
+
+    async def has_free_door(self):
+        return await self.redis.zcard(self.free_key) > 0
+
+    async def claim(self, user_id, status):
+        return _claim_result(await self._claim(keys=[self.key, self.free_key, self.user_key],
+                                               args=[user_id, status]))
+
+    async def release(self, door, status):
+        await self._release(keys=[self.key, self.free_key, self.user_key],
+                            args=[door, status, self._order[door]])
+
+    async def update_status(self, door, status):
+        return await self._update_status(keys=[self.key], args=[door, status]) == 1
+
+    async def find_by_user(self, user_id):
+        return await self.redis.hget(self.user_key, str(user_id))
+
+    async def all_doors(self):
+        return await self.redis.hgetall(self.key)
@@ -0,0 +1,138 @@
+"""
+Embedding Cache - Reuse FaceNet embeddings of faces that have not changed
+A preprocessed face crop is keyed by its difference hash (dHash) and a
+coarse box position; a crop within a few hash bits of a recent one at the
+same place gets that embedding back instead of a new FaceNet pass
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+def face_hash(face_image):
+    """
+    64-bit difference hash of a face crop
+
+    Args:
+        face_image: RGB uint8 array (preprocessed 160x160 crop)
+
+    Returns:
+        int: one bit per horizontally adjacent pixel pair of a 9x8 thumbnail
+    """
+    gray = cv2.cvtColor(face_image, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class EmbeddingCache:
+    def __init__(self, max_size=256, ttl=2.0, max_hash_distance=4, box_bucket=40):
+        """
+        Initialize an empty LRU cache
+
+        Args:
+            max_size: Maximum cached embeddings (least recently used go first)
+            ttl: Seconds an embedding is reused before FaceNet runs again
+            max_hash_distance: Max differing hash bits to count as the same
+                crop (0 = identical hash only)
+            box_bucket: Box position / size quantization in pixels
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_hash_distance = max_hash_distance
+        self.box_bucket = box_bucket
+
+        # (bucket, hash) -> (embedding, expires_at), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def key(self, face_image, face_location):
+        """Cache key of a preprocessed crop and its (top, right, bottom, left) box"""
+        top, right, bottom, left = face_location
+        bucket = (top // self.box_bucket, left // self.box_bucket,
+                  max(bottom - top, right - left) // self.box_bucket)
+        return bucket, face_hash(face_image)
+
+    def get(self, key, exact=False):
+        """
+        Cached embedding of a crop
+
+        Args:
+            key: Key from key()
+            exact: Only reuse an identical hash (no max_hash_distance
+                tolerance), for callers that act on the identity
+
+        Returns:
+            Embedding array, or None on a miss
+        """
+        with self._lock:
+            now = time.monotonic()
+            if key in self._entries:
+                entry_key = key
+            else:
+                entry_key = None if exact else self._nearest(key)
+            if entry_key is not None:
+                embedding, expires_at = self._entries[entry_key]
+                if expires_at > now:
+                    self._entries.move_to_end(entry_key)
+                    self._hits += 1
+                    return embedding
+                del self._entries[entry_key]
+                self._expired += 1
+            self._misses += 1
+            return None
+
+    def put(self, key, embedding):
+        """Cache the embedding of a crop (copied, so it does not pin its batch)"""
+        with self._lock:
+            self._entries[key] = (np.array(embedding), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0,
+                "expired": self._expired,
+                "evictions": self._evictions,
+            }
+
+    def _nearest(self, key):
+        """Closest cached hash in the same box bucket, within max_hash_distance"""
+        if self.max_hash_distance <= 0:
+            return None
+        bucket, hash_value = key
+        best_key, best_distance = None, self.max_hash_distance + 1
+        for entry_key in self._entries:
+            if entry_key[0] != bucket:
+                continue
+            distance = hamming_distance(entry_key[1], hash_value)
+            if distance < best_distance:
+                best_key, best_distance = entry_key, distance
+        return best_key
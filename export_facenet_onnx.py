@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Export keras-facenet to ONNX
+Writes the FaceNet model as .onnx (optionally int8-quantized) plus a
+"<model>.json" sidecar, and checks that ONNX Runtime embeddings match the
+Keras ones before the model is used by the "onnx" embedder backend
+
+Needs tensorflow, keras-facenet, tf2onnx and onnxruntime
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from face_embedders import standardize
+from face_gallery import normalize_encodings
+
+STANDARDIZATIONS = ["fixed", "prewhiten"]
+
+
+def sample_faces(image_path, count=32, seed=0):
+    """
+    uint8 RGB batch of shape (count, 160, 160, 3): shifted, scaled and
+    brightness-jittered crops of the test image
+    """
+    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise FileNotFoundError(f"Cannot read image {image_path}")
+    rng = np.random.default_rng(seed)
+    height, width = image.shape[:2]
+
+    faces = []
+    for _ in range(count):
+        scale = rng.uniform(0.7, 1.0)
+        crop_height, crop_width = int(height * scale), int(width * scale)
+        top = rng.integers(0, height - crop_height + 1)
+        left = rng.integers(0, width - crop_width + 1)
+        crop = image[top:top + crop_height, left:left + crop_width]
+        crop = cv2.convertScaleAbs(crop, alpha=rng.uniform(0.8, 1.2), beta=rng.uniform(-20, 20))
+        faces.append(cv2.cvtColor(cv2.resize(crop, (160, 160)), cv2.COLOR_BGR2RGB))
+    return np.stack(faces)
+
+
+def cosine_distances(reference, embeddings):
+    """Row-wise cosine distance between two (N, 512) arrays"""
+    return 1.0 - np.sum(normalize_encodings(reference) * normalize_encodings(embeddings), axis=1)
+
+
+def run_onnx(model_path, faces, method):
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    return session.run(None, {input_name: standardize(faces, method)})[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export keras-facenet to ONNX")
+    parser.add_argument("--output", default="models/facenet.onnx")
+    parser.add_argument("--quantize", action="store_true", help="Also write an int8 model (<output>-int8.onnx)")
+    parser.add_argument("--image", default="test.png", help="Image used for the parity check")
+    parser.add_argument("--opset", type=int, default=13)
+    parser.add_argument("--max-distance", type=float, default=0.02,
+                        help="Max mean cosine distance to the Keras embeddings")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    import tf2onnx
+    from keras_facenet import FaceNet
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    faces = sample_faces(args.image)
+
+    print("Loading keras-facenet...")
+    facenet = FaceNet()
+    reference = np.asarray(facenet.embeddings(faces))
+
+    print(f"Exporting to {args.output} (opset {args.opset})")
+    spec = [tf.TensorSpec((None, 160, 160, 3), tf.float32, name="input")]
+    tf2onnx.convert.from_keras(facenet.model, input_signature=spec, opset=args.opset,
+                               output_path=args.output)
+
+    # keras-facenet standardizes images outside the model: keep the
+    # method that reproduces its embeddings
+    distances = {method: cosine_distances(reference, run_onnx(args.output, faces, method))
+                 for method in STANDARDIZATIONS}
+    method = min(distances, key=lambda m: distances[m].mean())
+
+    models = [(args.output, False)]
+    if args.quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        root, ext = os.path.splitext(args.output)
+        quantized_path = f"{root}-int8{ext}"
+        print(f"Quantizing to {quantized_path}")
+        quantize_dynamic(args.output, quantized_path, weight_type=QuantType.QInt8)
+        models.append((quantized_path, True))
+
+    failed = False
+    print("=" * 60)
+    for model_path, quantized in models:
+        distance = cosine_distances(reference, run_onnx(model_path, faces, method))
+        parity = {
+            "faces": len(faces),
+            "mean_cosine_distance": float(distance.mean()),
+            "max_cosine_distance": float(distance.max()),
+        }
+        with open(f"{model_path}.json", "w") as f:
+            json.dump({"standardization": method, "quantized": quantized, "parity": parity}, f, indent=2)
+
+        ok = parity["mean_cosine_distance"] <= args.max_distance
+        failed |= not ok
+        print(f"{os.path.basename(model_path):<28} mean {parity['mean_cosine_distance']:.5f}  "
+              f"max {parity['max_cosine_distance']:.5f}  {'OK' if ok else 'FAILED'}  "
+              f"({os.path.getsize(model_path) / 1e6:.1f} MB)")
+    print(f"Input standardization: {method}")
+    print("=" * 60)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Face Detectors - Interchangeable face detection backends
+MTCNN (accurate, slow on CPU), OpenCV DNN YuNet / SSD (fast, need a local
+model file) and Haar cascade (last resort, ships with OpenCV)
+
+Every detector takes a BGR frame and returns a list of
+((top, right, bottom, left), confidence)
+"""
+import os
+
+import cv2
+import numpy as np
+
+
+def _clip_box(x, y, width, height, frame_shape):
+    """(x, y, w, h) -> (top, right, bottom, left) clipped to the frame"""
+    frame_height, frame_width = frame_shape[:2]
+    top = max(0, int(y))
+    left = max(0, int(x))
+    bottom = min(frame_height, int(y + height))
+    right = min(frame_width, int(x + width))
+    return top, right, bottom, left
+
+
+class MTCNNDetector:
+    name = "mtcnn"
+
+    def __init__(self):
+        # Heavy import (TensorFlow) only when this backend is used
+        from mtcnn import MTCNN
+        self.detector = MTCNN()
+
+    def detect(self, frame):
+        # MTCNN needs RGB
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        detections = self.detector.detect_faces(rgb_frame)
+        return [(_clip_box(*detection['box'], frame.shape), float(detection['confidence']))
+                for detection in detections]
+
+
+class YuNetDetector:
+    name = "yunet"
+
+    def __init__(self, model_path, score_threshold=0.8, nms_threshold=0.3, top_k=50):
+        """
+        Args:
+            model_path: Local face_detection_yunet_*.onnx file
+        """
+        if not model_path or not os.path.exists(model_path):
+            raise FileNotFoundError(f"YuNet model not found: {model_path}")
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320),
+                                                  score_threshold, nms_threshold, top_k)
+        self._input_size = None
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        if self._input_size != (width, height):
+            self.detector.setInputSize((width, height))
+            self._input_size = (width, height)
+        _, faces = self.detector.detect(frame)
+        if faces is None:
+            return []
+        return [(_clip_box(face[0], face[1], face[2], face[3], frame.shape), float(face[14]))
+                for face in faces]
+
+
+class SSDDetector:
+    name = "ssd"
+
+    def __init__(self, model_path, config_path=None, score_threshold=0.6):
+        """
+        Args:
+            model_path: Local res10_300x300_ssd_iter_140000.caffemodel file
+            config_path: Matching deploy.prototxt (default: next to the model)
+        """
+        if not model_path:
+            raise FileNotFoundError("SSD model path not set")
+        config_path = config_path or os.path.join(os.path.dirname(model_path), "deploy.prototxt")
+        for path in (model_path, config_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"SSD model file not found: {path}")
+        self.net = cv2.dnn.readNetFromCaffe(config_path, model_path)
+        self.score_threshold = score_threshold
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+
+        results = []
+        for detection in detections[detections[:, 2] >= self.score_threshold]:
+            x1, y1, x2, y2 = detection[3:7] * np.array([width, height, width, height])
+            results.append((_clip_box(x1, y1, x2 - x1, y2 - y1, frame.shape), float(detection[2])))
+        return results
+
+
+class HaarDetector:
+    name = "haar"
+
+    def __init__(self, model_path=None, scale_factor=1.1, min_neighbors=5, min_size=(40, 40)):
+        model_path = model_path or os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.detector = cv2.CascadeClassifier(model_path)
+        if self.detector.empty():
+            raise FileNotFoundError(f"Haar cascade not found: {model_path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces = self.detector.detectMultiScale(gray, scaleFactor=self.scale_factor,
+                                               minNeighbors=self.min_neighbors, minSize=self.min_size)
+        # Haar gives no score: every kept detection counts as confident
+        return [(_clip_box(x, y, w, h, frame.shape), 1.0) for (x, y, w, h) in faces]
+
+
+class ScaledDetector:
+    def __init__(self, detector, scale=1.0):
+        """
+        Run a detector on a downscaled frame and map boxes back
+
+        Args:
+            detector: Any detector above
+            scale: Detection scale factor (0.5 = detect at half resolution)
+        """
+        self.detector = detector
+        self.scale = scale
+        self.name = detector.name
+
+    def detect(self, frame):
+        if self.scale >= 1.0:
+            return self.detector.detect(frame)
+
+        small_frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        results = []
+        for (top, right, bottom, left), confidence in self.detector.detect(small_frame):
+            box = _clip_box(left / self.scale, top / self.scale,
+                            (right - left) / self.scale, (bottom - top) / self.scale, frame.shape)
+            results.append((box, confidence))
+        return results
+
+
+def create_detector(backend="mtcnn", model_path=None, scale=1.0, **kwargs):
+    """
+    Build a face detector by name, falling back to Haar cascade if the
+    requested backend cannot be loaded (e.g. missing model file)
+
+    Args:
+        backend: "mtcnn", "yunet", "ssd" or "haar"
+        model_path: Local model file for yunet / ssd (optional for haar)
+        scale: Detection downscale factor, boxes are mapped back to full resolution
+        **kwargs: Extra detector options (score_threshold, ...)
+
+    Returns:
+        Detector with a detect(frame) method
+    """
+    try:
+        if backend == "mtcnn":
+            detector = MTCNNDetector()
+        elif backend == "yunet":
+            detector = YuNetDetector(model_path, **kwargs)
+        elif backend == "ssd":
+            detector = SSDDetector(model_path, **kwargs)
+        elif backend == "haar":
+            detector = HaarDetector(model_path, **kwargs)
+        else:
+            raise ValueError(f"Unknown face detector backend: {backend}")
+    except (FileNotFoundError, AttributeError, cv2.error) as e:
+        if backend == "haar":
+            raise
+        print(f"Cannot load {backend} face detector ({e}) – falling back to Haar cascade")
+        detector = HaarDetector()
+
+    print(f"Face detector: {detector.name} (scale={scale})")
+    return ScaledDetector(detector, scale)
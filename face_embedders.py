@@ -0,0 +1,116 @@
+"""
+Face Embedders - Interchangeable FaceNet inference engines
+Keras (keras-facenet on TensorFlow) or the same model exported to ONNX
+(optionally int8-quantized, see export_facenet_onnx.py) and run with
+ONNX Runtime on CPU
+
+Every embedder takes a uint8 RGB batch of shape (N, 160, 160, 3) and
+returns a float32 array of shape (N, 512)
+"""
+import json
+import os
+
+import numpy as np
+
+
+def standardize(face_batch, method):
+    """
+    FaceNet input standardization
+
+    Args:
+        face_batch: uint8 array of shape (N, 160, 160, 3)
+        method: "fixed" ((x - 127.5) / 128) or "prewhiten" (per image
+            mean / std)
+
+    Returns:
+        float32 array of the same shape
+    """
+    batch = face_batch.astype(np.float32)
+    if method == "fixed":
+        return (batch - 127.5) / 128.0
+    if method == "prewhiten":
+        axes = (1, 2, 3)
+        mean = batch.mean(axis=axes, keepdims=True)
+        std = batch.std(axis=axes, keepdims=True)
+        std = np.maximum(std, 1.0 / np.sqrt(batch[0].size))
+        return (batch - mean) / std
+    raise ValueError(f"Unknown standardization: {method}")
+
+
+class KerasEmbedder:
+    name = "keras"
+
+    def __init__(self):
+        # Heavy import (TensorFlow) only when this backend is used
+        from keras_facenet import FaceNet
+        self.model = FaceNet()
+
+    def embeddings(self, face_batch):
+        # keras-facenet standardizes the images itself
+        return np.asarray(self.model.embeddings(face_batch), dtype=np.float32)
+
+
+class OnnxEmbedder:
+    name = "onnx"
+
+    def __init__(self, model_path, intra_op_threads=0):
+        """
+        Args:
+            model_path: FaceNet .onnx file written by export_facenet_onnx.py
+                (its "<model_path>.json" sidecar holds the input
+                standardization chosen by the export parity check)
+            intra_op_threads: ONNX Runtime threads (0 = runtime default)
+        """
+        if not model_path or not os.path.exists(model_path):
+            raise FileNotFoundError(f"FaceNet ONNX model not found: {model_path}")
+        import onnxruntime as ort
+
+        metadata = {}
+        metadata_path = f"{model_path}.json"
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                metadata = json.load(f)
+        self.standardization = metadata.get("standardization", "fixed")
+        self.quantized = metadata.get("quantized", False)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+        if self.quantized:
+            self.name = "onnx-int8"
+
+    def embeddings(self, face_batch):
+        inputs = standardize(np.asarray(face_batch), self.standardization)
+        return self.session.run(None, {self.input_name: inputs})[0].astype(np.float32, copy=False)
+
+
+def create_embedder(backend="keras", model_path=None, intra_op_threads=0):
+    """
+    Build a FaceNet embedder by name, falling back to Keras if the ONNX
+    model cannot be loaded (missing file or onnxruntime not installed)
+
+    Args:
+        backend: "keras" or "onnx"
+        model_path: FaceNet .onnx file for the onnx backend
+        intra_op_threads: ONNX Runtime threads (0 = runtime default)
+
+    Returns:
+        Embedder with an embeddings(face_batch) method
+    """
+    if backend == "keras":
+        embedder = KerasEmbedder()
+    elif backend == "onnx":
+        try:
+            embedder = OnnxEmbedder(model_path, intra_op_threads)
+        except (FileNotFoundError, ImportError) as e:
+            print(f"Cannot load ONNX FaceNet ({e}) – falling back to Keras")
+            embedder = KerasEmbedder()
+    else:
+        raise ValueError(f"Unknown face embedder backend: {backend}")
+
+    print(f"Face embedder: {embedder.name}")
+    return embedder
@@ -0,0 +1,453 @@
+"""
+Face Gallery - Known face encodings, L2-normalized float32
+Each identity keeps a few diverse sample encodings and is matched through
+one centroid row in a pluggable search index, optionally re-ranked against
+its samples
+"""
+import heapq
+import numbers
+import threading
+
+import numpy as np
+from face_index import FlatIndex
+
+
+def normalize_encodings(encodings):
+    """
+    L2-normalize one encoding or a batch of encodings
+
+    Args:
+        encodings: Array of shape (D,) or (N, D)
+
+    Returns:
+        float32 array of the same shape with unit-length rows
+        (zero vectors stay zero)
+    """
+    encodings = np.asarray(encodings, dtype=np.float32)
+    norms = np.linalg.norm(encodings, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return encodings / norms
+
+
+def _is_id(user_id):
+    """Allocator ids are non-negative integers (other ids are left alone)"""
+    return isinstance(user_id, numbers.Integral) and user_id >= 0
+
+
+class IdAllocator:
+    def __init__(self):
+        """
+        Hands out the smallest unused non-negative integer id
+
+        Released ids below the high-water mark go to a min-heap; ids taken
+        explicitly above it are skipped once the mark reaches them. Every
+        operation is O(log n) amortized.
+        """
+        self.reset()
+
+    def reset(self, used_ids=()):
+        """
+        Start over with the given ids in use
+
+        Args:
+            used_ids: Ids already taken (e.g. loaded from Redis)
+        """
+        self._high = 0
+        self._free = []
+        self._free_set = set()
+        self._taken_above = {int(user_id) for user_id in used_ids if _is_id(user_id)}
+
+    @property
+    def next_id(self):
+        """Id the next allocate() call returns"""
+        self._settle()
+        return self._free[0] if self._free else self._high
+
+    def allocate(self):
+        """Take the smallest unused id"""
+        self._settle()
+        if self._free:
+            user_id = heapq.heappop(self._free)
+            self._free_set.discard(user_id)
+            return user_id
+        self._high += 1
+        return self._high - 1
+
+    def reserve(self, user_id):
+        """Mark an explicitly chosen id as used"""
+        if not _is_id(user_id):
+            return
+        user_id = int(user_id)
+        if user_id >= self._high:
+            self._taken_above.add(user_id)
+        else:
+            # Lazily dropped from the heap by _settle
+            self._free_set.discard(user_id)
+
+    def release(self, user_id):
+        """Return an id so it can be handed out again"""
+        if not _is_id(user_id):
+            return
+        user_id = int(user_id)
+        if user_id >= self._high:
+            self._taken_above.discard(user_id)
+        elif user_id not in self._free_set:
+            heapq.heappush(self._free, user_id)
+            self._free_set.add(user_id)
+
+    def _settle(self):
+        # Drop heap entries reserved since they were freed
+        while self._free and self._free[0] not in self._free_set:
+            heapq.heappop(self._free)
+        # Move the high-water mark past explicitly taken ids
+        if not self._free:
+            while self._high in self._taken_above:
+                self._taken_above.discard(self._high)
+                self._high += 1
+
+
+class IdentityTemplate:
+    """
+    Sample encodings of one identity and their normalized centroid
+
+    Immutable: adding a sample returns a new template, so a published
+    gallery version never changes under a reader.
+    """
+    __slots__ = ("samples", "centroid")
+
+    def __init__(self, samples):
+        """
+        Args:
+            samples: Normalized float32 array of shape (K, D)
+        """
+        self.samples = samples
+        self.centroid = normalize_encodings(samples.mean(axis=0))
+
+    def __len__(self):
+        return len(self.samples)
+
+    def distance(self, probe):
+        """Cosine distance from a normalized probe to the closest sample"""
+        return float(1.0 - np.max(self.samples @ probe))
+
+    def with_sample(self, sample, max_samples, min_distance):
+        """
+        Template with one more sample, keeping the set diverse
+
+        A sample closer than min_distance to an existing one adds nothing.
+        When the template is full, the new sample replaces the most redundant
+        one (closest to its nearest neighbour), if that makes the set more
+        spread out.
+
+        Args:
+            sample: Normalized encoding of shape (D,)
+            max_samples: Maximum number of samples
+            min_distance: Minimum cosine distance to every kept sample
+
+        Returns:
+            New IdentityTemplate, or None if the sample is not worth keeping
+        """
+        distances = 1.0 - self.samples @ sample
+        if distances.min() < min_distance:
+            return None
+        if len(self.samples) < max_samples:
+            return IdentityTemplate(np.vstack([self.samples, sample]))
+
+        # Distance of each sample to its nearest other sample
+        pairwise = 1.0 - self.samples @ self.samples.T
+        np.fill_diagonal(pairwise, np.inf)
+        spread = pairwise.min(axis=1)
+        victim = int(np.argmin(spread))
+        if np.delete(distances, victim).min() <= spread[victim]:
+            return None
+        samples = self.samples.copy()
+        samples[victim] = sample
+        return IdentityTemplate(samples)
+
+
+class FaceGallery:
+    def __init__(self, dimension=512, index=None, max_samples=5, rerank=0,
+                 min_sample_distance=0.1, sample_tolerance=0.4):
+        """
+        Initialize an empty gallery
+
+        Reads (matching, ids, encodings) use the current snapshot and take
+        no lock. Writes (add, remove, load, enroll, learn) are serialized by
+        a writer lock, applied to a copy of the index and published by
+        swapping a single reference, so a reader always sees one consistent
+        version.
+
+        Args:
+            dimension: Encoding size
+            index: Search backend from face_index (default exact FlatIndex)
+            max_samples: Sample encodings kept per identity (1 = single
+                encoding, no learning)
+            rerank: Closest centroids re-ranked by their nearest sample
+                (0 = centroid distance only)
+            min_sample_distance: A new sample must be at least this far
+                (cosine) from the identity's samples
+            sample_tolerance: Max centroid distance for a matched encoding
+                to be learned as a sample (stricter than the match tolerance)
+        """
+        self.dimension = dimension
+        self.max_samples = max_samples
+        self.rerank = rerank
+        self.min_sample_distance = min_sample_distance
+        self.sample_tolerance = sample_tolerance
+
+        # One row per identity: its L2-normalized float32 centroid, so cosine
+        # distance is one matrix product. The IdentityTemplate is the row's
+        # payload, so it is versioned with the row
+        self._index = index if index is not None else FlatIndex(dimension)
+        self._write_lock = threading.Lock()
+        self._id_allocator = IdAllocator()
+        self.version = 0
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, user_id):
+        return user_id in self._index
+
+    def snapshot(self):
+        """Current index version (read-only, never modified after publishing)"""
+        return self._index
+
+    @property
+    def ids(self):
+        """List of user ids, in row order"""
+        return self._index.ids
+
+    @property
+    def encodings(self):
+        """Normalized centroid matrix of shape (N, D)"""
+        return self._index.encodings
+
+    def samples(self, user_id):
+        """
+        Sample encodings of a user
+
+        Returns:
+            float32 array of shape (K, D), or None if unknown
+        """
+        template = self._index.payload(user_id)
+        return None if template is None else template.samples
+
+    @property
+    def next_id(self):
+        """Smallest unused user id (given to the next enrolled face)"""
+        return self._id_allocator.next_id
+
+    # ================= WRITES =================
+
+    def add(self, user_id, encoding):
+        """
+        Add an encoding for a user
+
+        Args:
+            user_id: Identity of the face
+            encoding: Encoding of shape (D,)
+        """
+        with self._write_lock:
+            self._put(user_id, IdentityTemplate(normalize_encodings(encoding).reshape(1, self.dimension)))
+            self._id_allocator.reserve(user_id)
+
+    def remove(self, user_id, on_removed=None):
+        """
+        Remove a user from the gallery
+
+        Args:
+            user_id: User to remove
+            on_removed: Optional callback(user_id) run under the writer lock
+                after the user is gone and before the ID is released, so
+                cleanup (files, persistence) cannot race with a new face
+                enrolled under the reused ID
+
+        Returns:
+            True if the user was found and removed
+        """
+        with self._write_lock:
+            if user_id not in self._index:
+                return False
+            index = self._index.copy()
+            index.remove(user_id)
+            self._publish(index)
+            try:
+                if on_removed is not None:
+                    on_removed(user_id)
+            finally:
+                # Freed ID is reused by the next enrollment
+                self._id_allocator.release(user_id)
+            return True
+
+    def load(self, ids, encodings):
+        """
+        Replace the gallery content
+
+        Args:
+            ids: List of user ids
+            encodings: Encodings matching ids: shape (N, D), or a list of
+                (D,) encodings or (K, D) sample arrays
+        """
+        templates = {}
+        for user_id, samples in zip(ids, encodings):
+            samples = normalize_encodings(np.asarray(samples).reshape(-1, self.dimension))
+            templates[user_id] = IdentityTemplate(samples[:self.max_samples])
+
+        with self._write_lock:
+            index = self._index.copy()
+            index.reset()
+            if len(ids) > 0:
+                index.add_many(list(templates), np.stack([t.centroid for t in templates.values()]),
+                               list(templates.values()))
+            self._publish(index)
+            self._id_allocator.reset(ids)
+
+    def enroll(self, encoding, tolerance=0.6):
+        """
+        Match one encoding, adding it under a new user id if unknown
+
+        Matching runs lock-free first; only an unknown face takes the writer
+        lock, where it is matched again against the latest version so two
+        threads seeing the same new face do not create two users.
+
+        Args:
+            encoding: Encoding of shape (D,)
+            tolerance: Maximum cosine distance to count as a match
+
+        Returns:
+            Tuple (user_id, is_new)
+        """
+        user_id, _ = self.best_match(encoding, tolerance)
+        if user_id is not None:
+            return user_id, False
+
+        with self._write_lock:
+            user_id, _ = self.best_match(encoding, tolerance)
+            if user_id is not None:
+                return user_id, False
+
+            user_id = self._id_allocator.allocate()
+            self._put(user_id, IdentityTemplate(normalize_encodings(encoding).reshape(1, self.dimension)))
+            return user_id, True
+
+    def learn(self, user_id, encoding):
+        """
+        Keep a matched encoding as a new sample of the user if it adds
+        diversity (other pose / lighting), updating the centroid
+
+        The check runs lock-free; only a useful sample takes the writer lock.
+
+        Args:
+            user_id: User the encoding was matched to
+            encoding: Encoding of shape (D,)
+
+        Returns:
+            True if the sample was added
+        """
+        if self.max_samples <= 1:
+            return False
+        sample = normalize_encodings(encoding).reshape(self.dimension)
+        if self._grow(user_id, sample) is None:
+            return False
+
+        with self._write_lock:
+            template = self._grow(user_id, sample)
+            if template is None:
+                return False
+            self._put(user_id, template)
+            return True
+
+    def _grow(self, user_id, sample):
+        """Template of user_id with sample added, None if not worth it"""
+        template = self._index.payload(user_id)
+        if template is None or float(1.0 - template.centroid @ sample) > self.sample_tolerance:
+            return None
+        return template.with_sample(sample, self.max_samples, self.min_sample_distance)
+
+    def _put(self, user_id, template):
+        """Insert or replace a template (writer lock held)"""
+        index = self._index.copy()
+        if user_id in index:
+            index.remove(user_id)
+        index.add(user_id, template.centroid, template)
+        self._publish(index)
+
+    def _publish(self, index):
+        # Single reference assignment: readers see the old or the new version
+        self._index = index
+        self.version += 1
+
+    # ================= READS =================
+
+    def distances(self, probes):
+        """
+        Exact cosine distance between probe(s) and every identity centroid
+
+        Args:
+            probes: Encoding of shape (D,) or batch of shape (B, D)
+
+        Returns:
+            Array of shape (N,) for one probe or (B, N) for a batch,
+            rows in the order of ids
+        """
+        probes = normalize_encodings(probes)
+        return 1.0 - probes @ self._index.encodings.T
+
+    def best_match(self, probe, tolerance=0.6):
+        """
+        Find the closest known user for one probe
+
+        Args:
+            probe: Encoding of shape (D,)
+            tolerance: Maximum cosine distance to count as a match
+
+        Returns:
+            Tuple (user_id, distance); user_id is None when nothing is
+            within tolerance or the gallery is empty
+        """
+        return self.best_matches(np.asarray(probe).reshape(1, self.dimension), tolerance)[0]
+
+    def best_matches(self, probes, tolerance=0.6):
+        """
+        Batch version of best_match
+
+        Args:
+            probes: Encodings of shape (B, D)
+
+        Returns:
+            List of (user_id, distance) tuples, one per probe
+        """
+        index = self._index
+        probes = np.asarray(probes)
+        if len(index) == 0 or len(probes) == 0:
+            return [(None, None)] * len(probes)
+        probes = normalize_encodings(probes)
+        distances, ids = index.search(probes, k=max(1, self.rerank))
+        results = []
+        for row in range(len(probes)):
+            if len(ids[row]) == 0:
+                # Approximate index found no candidate in the probed clusters
+                results.append((None, None))
+                continue
+            if self.rerank > 0:
+                # Closest centroids, re-ranked by their nearest sample
+                candidates = [(index.payload(user_id).distance(probes[row]), user_id)
+                              for user_id in ids[row]]
+                distance, user_id = min(candidates, key=lambda candidate: candidate[0])
+            else:
+                distance, user_id = float(distances[row, 0]), ids[row][0]
+            results.append((user_id if distance <= tolerance else None, distance))
+        return results
+
+    def matches(self, probe, tolerance=0.6):
+        """
+        All known users within tolerance of one probe
+
+        Returns:
+            List of (user_id, distance) sorted by distance
+        """
+        index = self._index
+        if len(index) == 0:
+            return []
+        return index.range_search(normalize_encodings(probe).reshape(self.dimension), tolerance)
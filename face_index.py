@@ -0,0 +1,535 @@
+"""
+Face Index - Nearest-neighbour search backends for the face gallery
+FlatIndex is exact brute force, IVFIndex is an approximate inverted-file index
+"""
+import copy
+
+import numpy as np
+
+
+# removed_at value of a row no version has removed
+_LIVE = np.iinfo(np.int64).max
+
+
+class _Storage:
+    """Append-only row buffer shared by copies of a FlatIndex (see FlatIndex.copy)"""
+
+    def __init__(self, dimension, capacity):
+        self.matrix = np.empty((capacity, dimension), dtype=np.float32)
+        # Epoch of the copy that removed each row (_LIVE = never removed)
+        self.removed_at = np.full(capacity, _LIVE, dtype=np.int64)
+        self.ids = []
+        # Optional object stored with each row (e.g. the identity template)
+        self.payloads = []
+        # user_id -> rows written for it, oldest first
+        self.rows_of = {}
+        # Rows written so far, and epoch of the only copy allowed to write
+        self.length = 0
+        self.epoch = 0
+
+
+class FlatIndex:
+    def __init__(self, dimension=512, initial_capacity=64):
+        """
+        Initialize an empty exact index
+
+        Rows are appended to a preallocated buffer (doubled when full) with
+        an id -> rows dict. Removal only marks the row as removed in this
+        version (tombstone), so add and remove are O(1), also when the
+        buffer is shared with older snapshots. Once removed rows outnumber
+        live ones the live rows are compacted into a new buffer, O(1)
+        amortized per removal.
+
+        Args:
+            dimension: Encoding size
+            initial_capacity: Rows allocated up front
+        """
+        self.dimension = dimension
+        self.initial_capacity = initial_capacity
+        self.reset()
+
+    def __len__(self):
+        return self._count - self._dead
+
+    def __contains__(self, user_id):
+        return self._row_of(user_id) is not None
+
+    @property
+    def ids(self):
+        """List of user ids, in row order"""
+        storage = self._storage
+        if self._dead == 0:
+            return storage.ids[:self._count]
+        return [storage.ids[row] for row in np.flatnonzero(self._live_mask())]
+
+    @property
+    def encodings(self):
+        """Encoding matrix of shape (N, D), rows match ids"""
+        matrix = self._storage.matrix[:self._count]
+        return matrix if self._dead == 0 else matrix[self._live_mask()]
+
+    @property
+    def payloads(self):
+        """Payloads stored with the rows, in row order"""
+        storage = self._storage
+        if self._dead == 0:
+            return storage.payloads[:self._count]
+        return [storage.payloads[row] for row in np.flatnonzero(self._live_mask())]
+
+    def payload(self, user_id):
+        """Payload stored with user_id, or None"""
+        row = self._row_of(user_id)
+        return None if row is None else self._storage.payloads[row]
+
+    def copy(self):
+        """
+        Copy for copy-on-write updates, O(1)
+
+        Both copies share the row buffer. The copy of the newest version
+        becomes the only one that writes to it: it appends past the rows
+        older versions can see, and its removals are tombstones stamped
+        with its epoch, which older versions ignore. Changing any other
+        copy first gives it its own (compacted) buffer.
+        """
+        clone = copy.copy(self)
+        if self._is_head():
+            self._storage.epoch += 1
+            clone._epoch = self._storage.epoch
+        return clone
+
+    def reset(self):
+        """Remove every entry"""
+        self._storage = _Storage(self.dimension, self.initial_capacity)
+        # Rows visible to this version (removed ones included), removed
+        # rows among them, and epoch of this version
+        self._count = 0
+        self._dead = 0
+        self._epoch = 0
+
+    def add(self, user_id, encoding, payload=None):
+        """
+        Add one normalized encoding
+
+        Args:
+            user_id: Identity of the face
+            encoding: float32 array of shape (D,)
+            payload: Optional object stored with the row
+        """
+        self.add_many([user_id], np.asarray(encoding).reshape(1, self.dimension), [payload])
+
+    def add_many(self, ids, encodings, payloads=None):
+        """
+        Add a batch of normalized encodings
+
+        Args:
+            ids: List of user ids
+            encodings: float32 array of shape (N, D)
+            payloads: Optional list of objects stored with the rows
+        """
+        if len(ids) == 0:
+            return
+        storage = self._storage
+        if not self._is_head() or self._count + len(ids) > len(storage.matrix):
+            storage = self._own_storage(len(self) + len(ids))
+
+        start, count = self._count, self._count + len(ids)
+        storage.matrix[start:count] = encodings
+        storage.ids.extend(ids)
+        storage.payloads.extend(payloads if payloads is not None else [None] * len(ids))
+        for row, user_id in enumerate(ids, start):
+            storage.rows_of.setdefault(user_id, []).append(row)
+        storage.length = count
+        self._count = count
+
+    def remove(self, user_id):
+        """
+        Remove one user (its row becomes a tombstone for this version)
+
+        Returns:
+            True if the user was found and removed
+        """
+        row = self._row_of(user_id)
+        if row is None:
+            return False
+        if not self._is_head():
+            self._own_storage(len(self))
+            row = self._row_of(user_id)
+
+        self._storage.removed_at[row] = self._epoch
+        self._dead += 1
+        if self._dead > self.initial_capacity and self._dead * 2 > self._count:
+            # Removed rows outnumber live ones: compact
+            self._own_storage(len(self))
+        return True
+
+    def _is_head(self):
+        """True if this copy may write to the shared buffer in place"""
+        storage = self._storage
+        return self._epoch == storage.epoch and self._count == storage.length
+
+    def _live_mask(self):
+        """Boolean mask of the rows (up to _count) this version can see"""
+        return self._storage.removed_at[:self._count] > self._epoch
+
+    def _row_of(self, user_id):
+        """Row of user_id in this version, or None"""
+        storage = self._storage
+        for row in reversed(storage.rows_of.get(user_id, ())):
+            # Rows past _count belong to newer copies sharing the storage
+            if row < self._count and storage.removed_at[row] > self._epoch:
+                return row
+        return None
+
+    def _own_storage(self, min_capacity):
+        """Move the live rows to a private buffer of at least min_capacity rows"""
+        capacity = max(self.initial_capacity, len(self._storage.matrix))
+        while capacity < min_capacity:
+            capacity *= 2
+        storage = _Storage(self.dimension, capacity)
+        count = len(self)
+        storage.matrix[:count] = self.encodings
+        storage.ids = self.ids
+        storage.payloads = self.payloads
+        for row, user_id in enumerate(storage.ids):
+            storage.rows_of.setdefault(user_id, []).append(row)
+        storage.length = count
+        self._storage = storage
+        self._count = count
+        self._dead = 0
+        self._epoch = 0
+        return storage
+
+    def search(self, probes, k=1):
+        """
+        Find the k closest entries for each probe
+
+        Args:
+            probes: Normalized float32 array of shape (B, D)
+            k: Number of neighbours per probe
+
+        Returns:
+            Tuple (distances, ids): distances is a (B, k) array of cosine
+            distances padded with inf, ids is a list of B lists of user ids
+        """
+        probes = np.asarray(probes, dtype=np.float32)
+        count = self._count
+        distances = np.full((len(probes), k), np.inf, dtype=np.float32)
+        ids = [[] for _ in range(len(probes))]
+        if len(self) == 0 or len(probes) == 0:
+            return distances, ids
+
+        row_ids = self._storage.ids
+        all_distances = 1.0 - probes @ self._storage.matrix[:count].T
+        if self._dead:
+            all_distances[:, ~self._live_mask()] = np.inf
+        k_found = min(k, len(self))
+        if k_found == 1:
+            nearest = np.argmin(all_distances, axis=1)[:, None]
+        else:
+            nearest = np.argpartition(all_distances, k_found - 1, axis=1)[:, :k_found]
+            order = np.argsort(np.take_along_axis(all_distances, nearest, axis=1), axis=1)
+            nearest = np.take_along_axis(nearest, order, axis=1)
+
+        distances[:, :k_found] = np.take_along_axis(all_distances, nearest, axis=1)
+        for row in range(len(probes)):
+            ids[row] = [row_ids[i] for i in nearest[row]]
+        return distances, ids
+
+    def range_search(self, probe, tolerance):
+        """
+        All entries within tolerance of one probe
+
+        Returns:
+            List of (user_id, distance) sorted by distance
+        """
+        count = self._count
+        if len(self) == 0:
+            return []
+        row_ids = self._storage.ids
+        distances = 1.0 - self._storage.matrix[:count] @ np.asarray(probe, dtype=np.float32)
+        if self._dead:
+            distances[~self._live_mask()] = np.inf
+        indexes = np.flatnonzero(distances <= tolerance)
+        indexes = indexes[np.argsort(distances[indexes])]
+        return [(row_ids[i], float(distances[i])) for i in indexes]
+
+
+class IVFIndex:
+    def __init__(self, dimension=512, nlist=None, nprobe=8, train_threshold=1024,
+                 retrain_factor=2.0, kmeans_iterations=10, seed=0):
+        """
+        Initialize an approximate inverted-file index
+
+        Encodings are grouped into nlist clusters (spherical k-means), a query
+        only scans the nprobe clusters whose centroids are closest to it.
+
+        Args:
+            dimension: Encoding size
+            nlist: Number of clusters (default sqrt of gallery size at training)
+            nprobe: Clusters scanned per query - higher is more accurate but slower
+            train_threshold: Gallery size at which clustering starts; below it
+                the index behaves like a FlatIndex
+            retrain_factor: Re-cluster when the gallery grows by this factor
+                since the last training
+            kmeans_iterations: Number of k-means iterations per training
+            seed: Random seed for k-means initialization
+        """
+        self.dimension = dimension
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.retrain_factor = retrain_factor
+        self.kmeans_iterations = kmeans_iterations
+        self._rng = np.random.default_rng(seed)
+        self.reset()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, user_id):
+        return self._list_of(user_id) is not None
+
+    @property
+    def is_trained(self):
+        return self._centroids is not None
+
+    @property
+    def ids(self):
+        """List of user ids, in storage order"""
+        ids = []
+        for inverted_list in self._lists:
+            ids.extend(inverted_list.ids)
+        return ids
+
+    @property
+    def encodings(self):
+        """Encoding matrix of shape (N, D), rows match ids"""
+        return np.vstack([self._empty_matrix()] + [inverted_list.encodings for inverted_list in self._lists])
+
+    @property
+    def payloads(self):
+        """Payloads stored with the rows, in the order of ids"""
+        payloads = []
+        for inverted_list in self._lists:
+            payloads.extend(inverted_list.payloads)
+        return payloads
+
+    def payload(self, user_id):
+        """Payload stored with user_id, or None"""
+        list_no = self._list_of(user_id)
+        return None if list_no is None else self._lists[list_no].payload(user_id)
+
+    def copy(self):
+        """
+        Copy for copy-on-write updates, O(nlist)
+
+        Inverted lists are copied (O(1) each) and the id map is shared: the
+        newest copy adds to it in place, removals leave it untouched (every
+        lookup is confirmed in the list itself), and an add to an older copy
+        first gives the copy its own map.
+        """
+        clone = copy.copy(self)
+        clone._lists = [inverted_list.copy() for inverted_list in self._lists]
+        clone._map_token = object()
+        if self._map_state["head"] is self._map_token:
+            self._map_state["head"] = clone._map_token
+        return clone
+
+    def reset(self):
+        """Remove every entry and drop the clustering"""
+        self._centroids = None
+        self._lists = [FlatIndex(self.dimension)]
+        self._trained_size = 0
+        self._count = 0
+        self._new_id_map({})
+
+    def add(self, user_id, encoding, payload=None):
+        """Add one normalized encoding of shape (D,), with an optional payload"""
+        encoding = np.asarray(encoding, dtype=np.float32).reshape(self.dimension)
+        list_no = int(np.argmax(self._centroids @ encoding)) if self.is_trained else 0
+        self._lists[list_no].add(user_id, encoding, payload)
+        self._writable_id_map()[user_id] = list_no
+        self._count += 1
+        self._maybe_train()
+
+    def add_many(self, ids, encodings, payloads=None):
+        """Add a batch of normalized encodings of shape (N, D), with optional payloads"""
+        if len(ids) == 0:
+            return
+        encodings = np.asarray(encodings, dtype=np.float32)
+        if self.is_trained:
+            assignments = np.argmax(encodings @ self._centroids.T, axis=1)
+            self._add_assigned(ids, encodings, assignments, payloads)
+        else:
+            self._lists[0].add_many(ids, encodings, payloads)
+            id_map = self._writable_id_map()
+            for user_id in ids:
+                id_map[user_id] = 0
+            self._count += len(ids)
+        self._maybe_train()
+
+    def remove(self, user_id):
+        """
+        Remove one user
+
+        Returns:
+            True if the user was found and removed
+        """
+        list_no = self._list_of(user_id)
+        if list_no is None:
+            return False
+        # Stale map entry is harmless: lookups check the list
+        self._lists[list_no].remove(user_id)
+        self._count -= 1
+        return True
+
+    def train(self):
+        """Cluster the current content and rebuild the inverted lists"""
+        ids = self.ids
+        encodings = self.encodings
+        payloads = self.payloads
+        if len(ids) == 0:
+            return
+
+        nlist = self.nlist or int(np.sqrt(len(ids)))
+        nlist = max(1, min(nlist, len(ids)))
+        centroids = encodings[self._rng.choice(len(ids), nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assignments = np.argmax(encodings @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, encodings)
+            counts = np.bincount(assignments, minlength=nlist)
+            # Re-seed empty clusters with random encodings
+            empty = np.flatnonzero(counts == 0)
+            if len(empty) > 0:
+                sums[empty] = encodings[self._rng.choice(len(ids), len(empty))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+
+        self._centroids = centroids.astype(np.float32)
+        self._lists = [FlatIndex(self.dimension) for _ in range(nlist)]
+        self._count = 0
+        self._new_id_map({})
+        self._add_assigned(ids, encodings, np.argmax(encodings @ self._centroids.T, axis=1), payloads)
+        self._trained_size = len(ids)
+
+    def search(self, probes, k=1):
+        """
+        Find the (approximate) k closest entries for each probe
+
+        Args:
+            probes: Normalized float32 array of shape (B, D)
+            k: Number of neighbours per probe
+
+        Returns:
+            Tuple (distances, ids) in the same format as FlatIndex.search
+        """
+        probes = np.asarray(probes, dtype=np.float32)
+        if not self.is_trained:
+            return self._lists[0].search(probes, k)
+
+        distances = np.full((len(probes), k), np.inf, dtype=np.float32)
+        ids = [[] for _ in range(len(probes))]
+        for row, list_nos in enumerate(self._probe_lists(probes)):
+            candidate_distances = []
+            candidate_ids = []
+            for list_no in list_nos:
+                list_distances, list_ids = self._lists[list_no].search(probes[row:row + 1], k)
+                candidate_distances.extend(list_distances[0][:len(list_ids[0])])
+                candidate_ids.extend(list_ids[0])
+            order = np.argsort(candidate_distances)[:k]
+            distances[row, :len(order)] = np.asarray(candidate_distances)[order]
+            ids[row] = [candidate_ids[i] for i in order]
+        return distances, ids
+
+    def range_search(self, probe, tolerance):
+        """
+        Entries within tolerance of one probe, among the probed clusters
+
+        Returns:
+            List of (user_id, distance) sorted by distance
+        """
+        probe = np.asarray(probe, dtype=np.float32).reshape(self.dimension)
+        if not self.is_trained:
+            return self._lists[0].range_search(probe, tolerance)
+
+        results = []
+        for list_no in self._probe_lists(probe[None, :])[0]:
+            results.extend(self._lists[list_no].range_search(probe, tolerance))
+        return sorted(results, key=lambda item: item[1])
+
+    def _probe_lists(self, probes):
+        """Indexes of the nprobe closest clusters for each probe"""
+        similarities = probes @ self._centroids.T
+        nprobe = min(self.nprobe, len(self._centroids))
+        if nprobe == len(self._centroids):
+            return np.tile(np.arange(nprobe), (len(probes), 1))
+        return np.argpartition(-similarities, nprobe - 1, axis=1)[:, :nprobe]
+
+    def _add_assigned(self, ids, encodings, assignments, payloads=None):
+        for list_no in np.unique(assignments):
+            rows = np.flatnonzero(assignments == list_no)
+            list_ids = [ids[i] for i in rows]
+            list_payloads = [payloads[i] for i in rows] if payloads is not None else None
+            self._lists[list_no].add_many(list_ids, encodings[rows], list_payloads)
+            id_map = self._writable_id_map()
+            for user_id in list_ids:
+                id_map[user_id] = int(list_no)
+            self._count += len(list_ids)
+
+    def _new_id_map(self, id_map):
+        self._list_of_id = id_map
+        self._map_token = object()
+        self._map_state = {"head": self._map_token}
+
+    def _writable_id_map(self):
+        """user_id -> list number map this copy may modify in place"""
+        if self._map_state["head"] is not self._map_token:
+            self._new_id_map({user_id: list_no for user_id, list_no in self._list_of_id.items()
+                              if user_id in self._lists[list_no]})
+        return self._list_of_id
+
+    def _list_of(self, user_id):
+        """Inverted list holding user_id in this copy, or None"""
+        list_no = self._list_of_id.get(user_id)
+        if list_no is not None and user_id in self._lists[list_no]:
+            return list_no
+        if self._map_state["head"] is self._map_token:
+            # The newest copy's map is up to date
+            return None
+        # Older copy: the shared map may point to where a newer copy re-added it
+        for list_no, inverted_list in enumerate(self._lists):
+            if user_id in inverted_list:
+                return list_no
+        return None
+
+    def _maybe_train(self):
+        size = len(self)
+        if not self.is_trained:
+            if size >= self.train_threshold:
+                self.train()
+        elif size >= self._trained_size * self.retrain_factor:
+            self.train()
+
+    def _empty_matrix(self):
+        return np.empty((0, self.dimension), dtype=np.float32)
+
+
+def create_index(backend="flat", dimension=512, **kwargs):
+    """
+    Build a gallery index by name
+
+    Args:
+        backend: "flat" (exact) or "ivf" (approximate)
+        dimension: Encoding size
+        **kwargs: Extra options for IVFIndex (nlist, nprobe, ...), ignored by flat
+
+    Returns:
+        Index instance
+    """
+    if backend == "flat":
+        return FlatIndex(dimension)
+    if backend == "ivf":
+        return IVFIndex(dimension, **kwargs)
+    raise ValueError(f"Unknown face index backend: {backend}")
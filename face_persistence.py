@@ -0,0 +1,115 @@
+"""
+Face Persistence - Write-behind saving of the face gallery
+Changes are only recorded in memory; a background thread coalesces bursts
+(last change per user wins) and writes them out on a timer and on shutdown
+"""
+import threading
+
+
+class WriteBehindPersister:
+    def __init__(self, write, flush_interval=5.0, coalesce_delay=0.5):
+        """
+        Initialize persister
+
+        Args:
+            write: Callable taking a dict key -> value of pending changes and
+                saving it (slow part, runs on the persister thread without
+                any gallery lock)
+            flush_interval: Max seconds between a change and its write
+            coalesce_delay: Seconds to wait after a change for more changes
+                before writing
+        """
+        self.write = write
+        self.flush_interval = flush_interval
+        self.coalesce_delay = coalesce_delay
+
+        self._changed = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = {}
+        self._thread = None
+
+        self._flushes = 0
+        self._errors = 0
+
+    # ================= LIFECYCLE =================
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="face-persister", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=10):
+        """Stop the thread and write any pending change"""
+        self._stopping.set()
+        self._changed.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    # ================= PUBLIC API =================
+
+    def record_change(self, key, value):
+        """
+        Record a change (cheap, never blocks on I/O)
+
+        Args:
+            key: Changed item (user id)
+            value: New value, or None if the item was removed
+        """
+        with self._pending_lock:
+            self._pending[key] = value
+        self._changed.set()
+
+    def is_dirty(self):
+        return len(self._pending) > 0
+
+    def flush(self):
+        """
+        Write pending changes now
+
+        Returns:
+            True if nothing was pending or the write succeeded
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                changes, self._pending = self._pending, {}
+            if not changes:
+                return True
+            try:
+                self.write(changes)
+            except Exception as e:
+                self._errors += 1
+                print(f"Error persisting face data: {e}")
+                # Put changes back unless a newer change replaced them meanwhile
+                with self._pending_lock:
+                    for key, value in changes.items():
+                        self._pending.setdefault(key, value)
+                return False
+            self._flushes += 1
+            return True
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "flushes": self._flushes,
+            "errors": self._errors,
+        }
+
+    # ================= WORKER =================
+
+    def _run(self):
+        while not self._stopping.is_set():
+            # Wake up on a change, or on the timer to retry failed writes
+            self._changed.wait(self.flush_interval)
+            if self._stopping.is_set():
+                return
+            if self._changed.is_set():
+                # Let a burst of changes accumulate into one write
+                self._stopping.wait(self.coalesce_delay)
+            self._changed.clear()
+            self.flush()
@@ -0,0 +1,123 @@
+"""
+Face Store - Compact binary storage of face embeddings in Redis
+Each identity is one hash field holding its sample embeddings as raw
+float32 bytes (one or more rows back to back), so adding/removing a user is
+a single HSET/HDEL and loading is one np.frombuffer over the whole hash
+"""
+import json
+
+import numpy as np
+
+SCHEMA_VERSION = 2
+
+# Little-endian float32, independent of the host byte order
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+class RedisFaceStore:
+    def __init__(self, redis, prefix="face_gallery", dimension=512,
+                 legacy_key="face_recognition_data"):
+        """
+        Initialize store
+
+        Args:
+            redis: RedisService instance
+            prefix: Key prefix ({prefix}:embeddings hash, {prefix}:meta hash)
+            dimension: Embedding size
+            legacy_key: Old JSON key migrated on first load
+        """
+        self.redis = redis
+        self.dimension = dimension
+        self.embeddings_key = f"{prefix}:embeddings"
+        self.meta_key = f"{prefix}:meta"
+        self.legacy_key = legacy_key
+
+    def load(self):
+        """
+        Load every embedding, migrating the legacy JSON key if needed
+
+        Returns:
+            Tuple (ids, samples): list of int user ids and, for each, a
+            float32 array of shape (K, dimension)
+        """
+        schema_version = self.redis.hget(self.meta_key, "schema_version")
+        if schema_version is None:
+            self.migrate_legacy()
+        elif int(schema_version) != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported face data schema version: {schema_version}")
+
+        row_size = self.dimension * EMBEDDING_DTYPE.itemsize
+        ids = []
+        counts = []
+        chunks = []
+        for field, value in self.redis.hscan_bytes(self.embeddings_key):
+            if len(value) == 0 or len(value) % row_size:
+                print(f"Skipping face data of user {field!r}: invalid size {len(value)}")
+                continue
+            ids.append(int(field))
+            counts.append(len(value) // row_size)
+            chunks.append(value)
+
+        if not ids:
+            return [], []
+        encodings = np.frombuffer(b"".join(chunks), dtype=EMBEDDING_DTYPE)
+        encodings = encodings.reshape(-1, self.dimension).astype(np.float32)
+        return ids, np.split(encodings, np.cumsum(counts)[:-1])
+
+    def write_changes(self, changes):
+        """
+        Apply coalesced gallery changes
+
+        Args:
+            changes: Dict user_id -> encoding (D,) or samples (K, D), or
+                None for removed users
+        """
+        added = {str(user_id): self.encode(encoding)
+                 for user_id, encoding in changes.items() if encoding is not None}
+        removed = [str(user_id) for user_id, encoding in changes.items() if encoding is None]
+
+        # Adds and removes go out in one round trip
+        with self.redis.pipeline(raw=True) as pipe:
+            if added:
+                pipe.hset(self.embeddings_key, mapping=added)
+            if removed:
+                pipe.hdel(self.embeddings_key, *removed)
+        print(f"Saved face data to Redis: {len(added)} added, {len(removed)} removed")
+
+    def encode(self, encoding):
+        """Embedding (D,) or samples (K, D) -> raw float32 bytes"""
+        return np.asarray(encoding, dtype=EMBEDDING_DTYPE).reshape(-1, self.dimension).tobytes()
+
+    def migrate_legacy(self):
+        """
+        Convert the legacy JSON key into the binary format
+
+        The legacy key is kept under "{legacy_key}:migrated" as a backup.
+
+        Returns:
+            Number of migrated identities
+        """
+        legacy_data = self.redis.get(self.legacy_key)
+        count = 0
+        if legacy_data:
+            face_data = json.loads(legacy_data)
+            ids = face_data.get("known_ids", [])
+            encodings = face_data.get("known_encodings", [])
+            mapping = {str(user_id): self.encode(encoding) for user_id, encoding in zip(ids, encodings)}
+            count = len(mapping)
+
+        # Embeddings, schema version and backup rename applied together (MULTI/EXEC)
+        with self.redis.pipeline(transaction=True, raw=True) as pipe:
+            if count:
+                pipe.hset(self.embeddings_key, mapping=mapping)
+            pipe.hset(self.meta_key, mapping={
+                "schema_version": SCHEMA_VERSION,
+                "dimension": self.dimension,
+                "dtype": EMBEDDING_DTYPE.str,
+            })
+            if legacy_data:
+                pipe.rename(self.legacy_key, f"{self.legacy_key}:migrated")
+
+        if legacy_data:
+            print(f"Migrated {count} faces from legacy key {self.legacy_key}")
+        return count
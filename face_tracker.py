@@ -0,0 +1,157 @@
+"""
+Face Tracker - Keep face boxes alive between detections
+Boxes are matched to detections by IoU and moved with sparse optical flow
+in between, so each track's identity only has to be computed once
+"""
+import itertools
+
+import cv2
+import numpy as np
+
+
+def box_iou(box_a, box_b):
+    """IoU of two (top, right, bottom, left) boxes"""
+    top = max(box_a[0], box_b[0])
+    right = min(box_a[1], box_b[1])
+    bottom = min(box_a[2], box_b[2])
+    left = max(box_a[3], box_b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    if intersection == 0:
+        return 0.0
+    area_a = (box_a[1] - box_a[3]) * (box_a[2] - box_a[0])
+    area_b = (box_b[1] - box_b[3]) * (box_b[2] - box_b[0])
+    return intersection / float(area_a + area_b - intersection)
+
+
+class Track:
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box  # (top, right, bottom, left)
+        self.user_id = None  # Cached identity, None until recognized
+        self.misses = 0
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_misses=3, min_flow_points=4):
+        """
+        Initialize tracker
+
+        Args:
+            iou_threshold: Minimum IoU to match a detection to a track
+            max_misses: Detections / flow failures a track survives before it is dropped
+            min_flow_points: Minimum tracked points to trust an optical flow update
+        """
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.min_flow_points = min_flow_points
+
+        self.tracks = []
+        self._ids = itertools.count()
+        self._prev_gray = None
+
+    def clear(self):
+        """Drop every track (and its cached identity)"""
+        self.tracks = []
+
+    def update(self, frame, detections):
+        """
+        Match fresh detections to tracks
+
+        Matched tracks take the detected box and keep their identity,
+        unmatched detections start new tracks without identity.
+
+        Args:
+            frame: BGR frame the detections come from
+            detections: List of (top, right, bottom, left)
+
+        Returns:
+            List of current tracks
+        """
+        self._prev_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        pairs = []
+        for t, track in enumerate(self.tracks):
+            for d, detection in enumerate(detections):
+                iou = box_iou(track.box, detection)
+                if iou >= self.iou_threshold:
+                    pairs.append((iou, t, d))
+
+        # Greedy matching, best IoU first
+        matched_tracks = set()
+        matched_detections = set()
+        for _, t, d in sorted(pairs, reverse=True):
+            if t in matched_tracks or d in matched_detections:
+                continue
+            self.tracks[t].box = tuple(detections[d])
+            self.tracks[t].misses = 0
+            matched_tracks.add(t)
+            matched_detections.add(d)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for d, detection in enumerate(detections):
+            if d not in matched_detections:
+                self.tracks.append(Track(next(self._ids), tuple(detection)))
+
+        return self.tracks
+
+    def propagate(self, frame):
+        """
+        Move every track to the new frame with sparse optical flow
+
+        Args:
+            frame: BGR frame following the last update/propagate frame
+
+        Returns:
+            List of current tracks
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        prev_gray = self._prev_gray
+        self._prev_gray = gray
+        if prev_gray is None or prev_gray.shape != gray.shape:
+            return self.tracks
+
+        for track in self.tracks:
+            shift = self._box_flow(prev_gray, gray, track.box)
+            if shift is None:
+                track.misses += 1
+                continue
+            dx, dy = shift
+            top, right, bottom, left = track.box
+            track.box = (int(round(top + dy)), int(round(right + dx)),
+                         int(round(bottom + dy)), int(round(left + dx)))
+
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+        return self.tracks
+
+    def has_lost_tracks(self):
+        """True if some track failed to follow the last frames"""
+        return any(track.misses > 0 for track in self.tracks)
+
+    def _box_flow(self, prev_gray, gray, box):
+        """Median (dx, dy) of features inside box, or None if tracking failed"""
+        top, right, bottom, left = box
+        height, width = gray.shape
+        top, left = max(0, top), max(0, left)
+        bottom, right = min(height, bottom), min(width, right)
+        if bottom - top < 8 or right - left < 8:
+            return None
+
+        mask = np.zeros_like(prev_gray)
+        mask[top:bottom, left:right] = 255
+        points = cv2.goodFeaturesToTrack(prev_gray, maxCorners=30, qualityLevel=0.01,
+                                         minDistance=5, mask=mask)
+        if points is None or len(points) < self.min_flow_points:
+            return None
+
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None)
+        good = status.reshape(-1) == 1
+        if good.sum() < self.min_flow_points:
+            return None
+
+        flow = (new_points[good] - points[good]).reshape(-1, 2)
+        dx, dy = np.median(flow, axis=0)
+        return float(dx), float(dy)
@@ -4,28 +4,226 @@ Replacement for face_recognition library
 """
 import cv2
 import numpy as np
-from mtcnn import MTCNN
-from keras_facenet import FaceNet
+from face_gallery import normalize_encodings
+from face_detectors import create_detector
+from face_embedders import create_embedder
 import os
+import threading
+import time
 
-class FaceNetService:
-    def __init__(self):
-        """Initialize FaceNet service"""
-        print("Initializing FaceNet service...")
+
+def preprocess_face(frame, face_location):
+    """
+    Crop a face and prepare it for FaceNet
+    
+    Args:
+        frame: BGR frame from OpenCV
+        face_location: Tuple (top, right, bottom, left)
+        
+    Returns:
+        RGB uint8 array of shape (160, 160, 3) or None if crop is invalid
+    """
+    top, right, bottom, left = face_location
+    
+    # Ensure valid coordinates
+    top = max(0, top)
+    left = max(0, left)
+    bottom = min(frame.shape[0], bottom)
+    right = min(frame.shape[1], right)
+    
+    # Crop face
+    face_image = frame[top:bottom, left:right]
+    
+    if face_image.size == 0 or face_image.shape[0] < 10 or face_image.shape[1] < 10:
+        return None
+    
+    # Resize to 160x160 (size required by FaceNet)
+    face_image_resized = cv2.resize(face_image, (160, 160))
+    
+    # Convert to RGB (FaceNet needs RGB)
+    face_image_rgb = cv2.cvtColor(face_image_resized, cv2.COLOR_BGR2RGB)
+    
+    # FaceNet model in keras-facenet automatically handles normalization
+    # Just ensure data type is uint8
+    return face_image_rgb.astype('uint8')
+
+
+def prepare_faces(frame, face_locations, embedding_cache=None, exact_cache=False):
+    """
+    Preprocess the faces of a frame, taking what it can from the cache
+    
+    Args:
+        frame: BGR frame from OpenCV
+        face_locations: List of tuples (top, right, bottom, left)
+        embedding_cache: Optional EmbeddingCache
+        exact_cache: Only reuse embeddings of identical crop hashes
         
-        # Initialize MTCNN for face detection
-        self.detector = MTCNN()
+    Returns:
+        Tuple (encodings, crops, indexes, keys): encodings aligned with
+        face_locations holding the cached ones (None elsewhere), and the
+        crops still to embed with their position in face_locations and
+        cache key (None without a cache)
+    """
+    encodings = [None] * len(face_locations)
+    crops = []
+    indexes = []
+    keys = []
+    for i, face_location in enumerate(face_locations):
+        face_image = preprocess_face(frame, face_location)
+        if face_image is None:
+            continue
+        key = None
+        if embedding_cache is not None:
+            key = embedding_cache.key(face_image, face_location)
+            encodings[i] = embedding_cache.get(key, exact=exact_cache)
+            if encodings[i] is not None:
+                continue
+        crops.append(face_image)
+        indexes.append(i)
+        keys.append(key)
+    return encodings, crops, indexes, keys
+
+
+def fill_encodings(encodings, indexes, keys, embeddings, embedding_cache=None):
+    """Put fresh embeddings in place (see prepare_faces) and cache them"""
+    for i, key, embedding in zip(indexes, keys, embeddings):
+        encodings[i] = embedding
+        if embedding_cache is not None:
+            embedding_cache.put(key, embedding)
+    return encodings
+
+
+class FaceNetService:
+    def __init__(self, lazy=False, ready_timeout=120, warmup_batch_size=1,
+                 detector_backend="mtcnn", detector_model_path=None, detection_scale=1.0,
+                 embedder_backend="keras", embedder_model_path=None, embedder_threads=0,
+                 embedding_cache=None):
+        """
+        Initialize FaceNet service
         
-        # Initialize FaceNet model for face encoding
-        # FaceNet will automatically load model on initialization
-        self.embedder = FaceNet()
+        Args:
+            lazy: If True, do not load models here; call start_loading()
+                (background thread) or load() later
+            ready_timeout: Max seconds a detection/encoding call waits for
+                models that are still loading
+            warmup_batch_size: Largest batch size warmed up at load time
+            detector_backend: "mtcnn", "yunet", "ssd" or "haar" (see face_detectors)
+            detector_model_path: Local model file for the yunet / ssd backends
+            detection_scale: Downscale factor for detection (boxes are mapped
+                back to full resolution)
+            embedder_backend: "keras" or "onnx" (see face_embedders)
+            embedder_model_path: FaceNet .onnx file for the onnx backend
+            embedder_threads: ONNX Runtime intra-op threads (0 = default)
+            embedding_cache: Optional EmbeddingCache reusing embeddings of
+                unchanged face crops
+        """
+        self.detector_backend = detector_backend
+        self.detector_model_path = detector_model_path
+        self.detection_scale = detection_scale
+        self.embedder_backend = embedder_backend
+        self.embedder_model_path = embedder_model_path
+        self.embedder_threads = embedder_threads
+        self.embedding_cache = embedding_cache
+        self.detector = None
+        self.embedder = None
+        self.ready_timeout = ready_timeout
+        self.warmup_batch_size = warmup_batch_size
         
         # Threshold for face comparison (cosine distance)
         # With FaceNet, distance is usually < 1.0 for the same person
         # Threshold 0.6-0.7 usually works well
         self.threshold = 0.6
         
-        print("FaceNet service is ready!")
+        # Readiness: pending -> loading -> ready | failed
+        self.state = "pending"
+        self.error = None
+        self.load_seconds = None
+        # Set once loading has finished, successfully or not
+        self._loaded = threading.Event()
+        self._load_lock = threading.Lock()
+        
+        if not lazy:
+            self.load()
+    
+    def load(self):
+        """Load MTCNN + FaceNet and run a warm-up inference (blocking)"""
+        with self._load_lock:
+            if self.state in ("loading", "ready"):
+                return
+            self.state = "loading"
+            self.error = None
+            self._loaded.clear()
+        
+        print("Initializing FaceNet service...")
+        started_at = time.monotonic()
+        try:
+            # Heavy imports (TensorFlow / ONNX Runtime) happen here, not at module import
+            
+            # Initialize face detector (MTCNN or a faster OpenCV backend)
+            self.detector = create_detector(self.detector_backend,
+                                            model_path=self.detector_model_path,
+                                            scale=self.detection_scale)
+            
+            # Initialize FaceNet model for face encoding (Keras or ONNX Runtime)
+            self.embedder = create_embedder(self.embedder_backend,
+                                            model_path=self.embedder_model_path,
+                                            intra_op_threads=self.embedder_threads)
+            
+            self._warm_up()
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            # Wake up waiting calls so they fail now instead of timing out
+            self._loaded.set()
+            print(f"FaceNet service failed to load: {e}")
+            raise
+        
+        self.load_seconds = round(time.monotonic() - started_at, 2)
+        self.state = "ready"
+        self._loaded.set()
+        print(f"FaceNet service is ready! ({self.load_seconds}s)")
+    
+    def start_loading(self):
+        """Load models on a background thread"""
+        def run():
+            try:
+                self.load()
+            except Exception:
+                pass  # state/error already recorded
+        
+        threading.Thread(target=run, name="facenet-loader", daemon=True).start()
+    
+    def is_ready(self):
+        return self.state == "ready"
+    
+    def wait_until_ready(self, timeout=None):
+        """True once models are loaded, False on timeout or failed load"""
+        return self._loaded.wait(timeout) and self.state == "ready"
+    
+    def status(self):
+        """Readiness state for /status"""
+        return {
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+    
+    def _warm_up(self):
+        """Run dummy inferences so graph tracing is not paid by the first request"""
+        # Single face (door requests) and a full batch (busy streams)
+        for batch_size in sorted({1, self.warmup_batch_size}):
+            self.embedder.embeddings(np.zeros((batch_size, 160, 160, 3), dtype=np.uint8))
+        self.detector.detect(np.zeros((480, 640, 3), dtype=np.uint8))
+    
+    def _require_ready(self):
+        if self.state == "ready":
+            return
+        if self.state == "failed":
+            raise RuntimeError(f"FaceNet models failed to load: {self.error}")
+        if not self._loaded.wait(self.ready_timeout):
+            raise RuntimeError(f"FaceNet models are not ready (state={self.state})")
+        if self.state != "ready":
+            raise RuntimeError(f"FaceNet models failed to load: {self.error}")
     
     def detect_faces(self, frame):
         """
@@ -37,79 +235,94 @@ class FaceNetService:
         Returns:
             List of face locations in format [(top, right, bottom, left), ...]
         """
-        # MTCNN needs RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return [face_location for face_location, _ in self.detect_faces_with_scores(frame)]
+    
+    def detect_faces_with_scores(self, frame):
+        """
+        Detect faces in frame, keeping the detector confidence
         
-        # Detect faces
-        detections = self.detector.detect_faces(rgb_frame)
+        Args:
+            frame: BGR frame from OpenCV
+            
+        Returns:
+            List of ((top, right, bottom, left), confidence)
+        """
+        self._require_ready()
         
-        face_locations = []
-        for detection in detections:
-            x, y, width, height = detection['box']
-            # Convert from (x, y, width, height) to (top, right, bottom, left)
-            top = y
-            right = x + width
-            bottom = y + height
-            left = x
-            face_locations.append((top, right, bottom, left))
+        # Detect faces, boxes already in (top, right, bottom, left)
+        return self.detector.detect(frame)
+    
+    def preprocess_face(self, frame, face_location):
+        """Crop a face and prepare it for FaceNet (see preprocess_face)"""
+        return preprocess_face(frame, face_location)
+    
+    def prepare_faces(self, frame, face_locations, exact_cache=False):
+        """Preprocess faces, cached encodings filled in (see prepare_faces)"""
+        return prepare_faces(frame, face_locations, self.embedding_cache, exact_cache)
+    
+    def fill_encodings(self, encodings, indexes, keys, embeddings):
+        """Store fresh embeddings in encodings and the cache (see fill_encodings)"""
+        return fill_encodings(encodings, indexes, keys, embeddings, self.embedding_cache)
+    
+    def embed_faces(self, face_batch):
+        """
+        Run FaceNet on a batch of preprocessed faces in one forward pass
         
-        return face_locations
+        Args:
+            face_batch: uint8 array of shape (N, 160, 160, 3)
+            
+        Returns:
+            Numpy array of shape (N, 512)
+        """
+        self._require_ready()
+        
+        # Get embeddings - every embedder returns a float32 numpy array
+        return self.embedder.embeddings(face_batch)
     
-    def get_face_encoding(self, frame, face_location):
+    def get_face_encodings(self, frame, face_locations, exact_cache=False):
         """
-        Get encoding of a face
+        Get encodings of all faces in a frame with a single FaceNet call
         
         Args:
             frame: BGR frame from OpenCV
-            face_location: Tuple (top, right, bottom, left)
+            face_locations: List of tuples (top, right, bottom, left)
+            exact_cache: Only reuse cached embeddings of identical crop
+                hashes (door recognition acts on the identity)
             
         Returns:
-            Numpy array encoding of face or None if error
+            List of numpy array encodings aligned with face_locations,
+            None for faces that could not be encoded
         """
+        encodings = [None] * len(face_locations)
         try:
-            top, right, bottom, left = face_location
-            
-            # Ensure valid coordinates
-            top = max(0, top)
-            left = max(0, left)
-            bottom = min(frame.shape[0], bottom)
-            right = min(frame.shape[1], right)
-            
-            # Crop face
-            face_image = frame[top:bottom, left:right]
-            
-            if face_image.size == 0 or face_image.shape[0] < 10 or face_image.shape[1] < 10:
-                return None
-            
-            # Resize to 160x160 (size required by FaceNet)
-            face_image_resized = cv2.resize(face_image, (160, 160))
+            # Unchanged faces reuse their cached embedding
+            encodings, crops, indexes, keys = self.prepare_faces(frame, face_locations, exact_cache)
             
-            # Convert to RGB (FaceNet needs RGB)
-            face_image_rgb = cv2.cvtColor(face_image_resized, cv2.COLOR_BGR2RGB)
+            if len(crops) == 0:
+                return encodings
             
-            # FaceNet model in keras-facenet automatically handles normalization
-            # Just ensure data type is uint8
-            face_image_rgb = face_image_rgb.astype('uint8')
-            
-            # Add batch dimension: shape (1, 160, 160, 3)
-            face_image_batch = np.expand_dims(face_image_rgb, axis=0)
-            
-            # Get embedding - keras-facenet returns numpy array
-            embedding = self.embedder.embeddings(face_image_batch)
-            
-            # embedding can be list or array, get first element
-            if isinstance(embedding, list):
-                embedding = embedding[0]
-            elif embedding.ndim > 1:
-                embedding = embedding[0]
-            
-            return embedding
+            # Stack crops into one batch: shape (N, 160, 160, 3)
+            embeddings = self.embed_faces(np.stack(crops))
+            return self.fill_encodings(encodings, indexes, keys, embeddings)
             
         except Exception as e:
-            print(f"Error getting encoding: {e}")
+            print(f"Error getting encodings: {e}")
             import traceback
             traceback.print_exc()
-            return None
+            return encodings
+    
+    def get_face_encoding(self, frame, face_location):
+        """
+        Get encoding of a face
+        
+        Args:
+            frame: BGR frame from OpenCV
+            face_location: Tuple (top, right, bottom, left)
+            
+        Returns:
+            Numpy array encoding of face or None if error
+        """
+        return self.get_face_encodings(frame, [face_location])[0]
     
     def compare_faces(self, known_encodings, face_encoding, tolerance=None):
         """
@@ -121,7 +334,7 @@ class FaceNetService:
             tolerance: Threshold to determine match (default uses self.threshold)
             
         Returns:
-            List of booleans indicating which faces match
+            Array of booleans indicating which faces match
         """
         if tolerance is None:
             tolerance = self.threshold
@@ -129,14 +342,8 @@ class FaceNetService:
         if len(known_encodings) == 0:
             return []
         
-        matches = []
-        for known_encoding in known_encodings:
-            # Calculate cosine distance
-            distance = self.face_distance([known_encoding], face_encoding)[0]
-            # If distance is less than threshold then it's a match
-            matches.append(distance <= tolerance)
-        
-        return matches
+        # If distance is less than threshold then it's a match
+        return self.face_distance(known_encodings, face_encoding) <= tolerance
     
     def face_distance(self, face_encodings, face_to_compare):
         """
@@ -147,27 +354,12 @@ class FaceNetService:
             face_to_compare: Encoding to compare
             
         Returns:
-            List of distances (cosine distance)
+            Array of distances (cosine distance)
         """
         if len(face_encodings) == 0:
             return []
         
-        distances = []
-        for encoding in face_encodings:
-            # Calculate cosine distance
-            # Cosine distance = 1 - cosine similarity
-            dot_product = np.dot(encoding, face_to_compare)
-            norm_a = np.linalg.norm(encoding)
-            norm_b = np.linalg.norm(face_to_compare)
-            
-            if norm_a == 0 or norm_b == 0:
-                distance = 1.0  # If one of the vectors is 0
-            else:
-                cosine_similarity = dot_product / (norm_a * norm_b)
-                # Cosine distance: 0 = completely identical, 1 = completely different
-                distance = 1 - cosine_similarity
-            
-            distances.append(distance)
-        
-        return distances
-
+        # Cosine distance = 1 - cosine similarity, computed for all encodings at once
+        # 0 = completely identical, 1 = completely different (zero vectors give 1.0)
+        known_matrix = normalize_encodings(np.asarray(face_encodings))
+        return 1.0 - known_matrix @ normalize_encodings(face_to_compare)
@@ -0,0 +1,129 @@
+"""
+Frame Quality - Pick the best face out of a short capture window
+Frames are ranked by a cheap whole-frame sharpness score and faces are
+detected on the sharpest one; the next frame is only tried when no face
+there passes. Faces are scored by detector confidence, size and sharpness,
+and only the winning face is embedded.
+"""
+import cv2
+
+# Width of the grayscale thumbnail used to rank whole frames
+RANK_WIDTH = 160
+
+# Face crops are scored at the FaceNet input size so sharpness is
+# comparable between near and far faces
+FACE_SIZE = 160
+
+
+def laplacian_variance(gray):
+    """Variance of the Laplacian of a grayscale image (higher = sharper)"""
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def frame_sharpness(frame):
+    """Sharpness of a whole BGR frame, measured on a small thumbnail"""
+    height, width = frame.shape[:2]
+    if width > RANK_WIDTH:
+        frame = cv2.resize(frame, (RANK_WIDTH, max(1, height * RANK_WIDTH // width)),
+                           interpolation=cv2.INTER_AREA)
+    return laplacian_variance(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+
+
+def face_sharpness(frame, face_location):
+    """Sharpness of a face crop resized to the FaceNet input size"""
+    top, right, bottom, left = face_location
+    crop = frame[top:bottom, left:right]
+    if crop.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return laplacian_variance(cv2.resize(gray, (FACE_SIZE, FACE_SIZE)))
+
+
+class FaceQualitySelector:
+    def __init__(self, candidate_frames=3, min_confidence=0.9, min_face_size=40,
+                 target_face_size=112, target_sharpness=100.0):
+        """
+        Initialize selector
+
+        Args:
+            candidate_frames: Max frames of the window that go through face
+                detection, sharpest first, until one has a usable face
+            min_confidence: Faces below this detector confidence are ignored
+            min_face_size: Faces smaller than this (pixels, shorter side) are ignored
+            target_face_size: Face size (pixels) that gets the full size score
+            target_sharpness: Face Laplacian variance that gets the full
+                sharpness score
+        """
+        self.candidate_frames = candidate_frames
+        self.min_confidence = min_confidence
+        self.min_face_size = min_face_size
+        self.target_face_size = target_face_size
+        self.target_sharpness = target_sharpness
+
+    def candidates(self, frames):
+        """
+        Sharpest frames of the window, best first (ties: newest first)
+
+        Args:
+            frames: BGR frames, oldest first
+        """
+        newest_first = list(reversed(frames))
+        scores = [frame_sharpness(frame) for frame in newest_first]
+        order = sorted(range(len(newest_first)), key=lambda i: -scores[i])
+        return [newest_first[i] for i in order[:self.candidate_frames]]
+
+    def face_score(self, frame, face_location, confidence):
+        """
+        Quality of one detected face in [0, 1] (0 = unusable)
+
+        Product of detector confidence, size and sharpness, the last two
+        capped at 1 once they reach their target
+        """
+        top, right, bottom, left = face_location
+        size = min(bottom - top, right - left)
+        if confidence < self.min_confidence or size < self.min_face_size:
+            return 0.0
+        size_score = min(1.0, size / self.target_face_size)
+        sharpness_score = min(1.0, face_sharpness(frame, face_location) / self.target_sharpness)
+        return confidence * size_score * sharpness_score
+
+    def best_face(self, frames, detections):
+        """
+        Best scoring face over several frames
+
+        Args:
+            frames: BGR frames
+            detections: For each frame, list of ((top, right, bottom, left), confidence)
+
+        Returns:
+            Tuple (frame, face_location, score) or None if no usable face
+        """
+        best = None
+        for frame, faces in zip(frames, detections):
+            for face_location, confidence in faces:
+                score = self.face_score(frame, face_location, confidence)
+                if score > 0 and (best is None or score > best[2]):
+                    best = (frame, face_location, score)
+        return best
+
+    def select(self, frames, detect_faces):
+        """
+        Pick the best face of a capture window
+
+        Detection runs on the sharpest frame first; a further candidate is
+        only detected when no face of the previous one passes, so a clear
+        frame costs a single detection.
+
+        Args:
+            frames: BGR frames, oldest first
+            detect_faces: Callable frame ->
+                [((top, right, bottom, left), confidence), ...]
+
+        Returns:
+            Tuple (frame, face_location, score) or None if no usable face
+        """
+        for frame in self.candidates(frames):
+            best = self.best_face([frame], [detect_faces(frame)])
+            if best is not None:
+                return best
+        return None
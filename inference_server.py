@@ -0,0 +1,227 @@
+"""
+Inference Server - Central worker that owns the face models
+Face crops from every camera stream and door request are micro-batched
+into a single FaceNet call; results are returned through futures
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class _DetectJob:
+    def __init__(self, frame, with_scores=False):
+        self.frame = frame
+        self.with_scores = with_scores
+        self.future = Future()
+
+
+class _EncodeJob:
+    def __init__(self, encodings, crops, indexes, keys):
+        self.encodings = encodings
+        self.crops = crops
+        self.indexes = indexes
+        self.keys = keys
+        self.future = Future()
+
+
+class InferenceServer:
+    def __init__(self, facenet_service, max_batch_size=16, max_wait_ms=10):
+        """
+        Initialize inference server
+
+        Args:
+            facenet_service: FaceNetService used for detection and embedding
+            max_batch_size: Maximum number of face crops per FaceNet call
+            max_wait_ms: Maximum time to wait for more crops before running a
+                batch that is not full
+        """
+        self.facenet_service = facenet_service
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._faces = 0
+        self._detections = 0
+
+    # ================= LIFECYCLE =================
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="inference-server", daemon=True)
+        self._thread.start()
+        print(f"Inference server started (max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait_ms})")
+
+    def stop(self, timeout=5):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # ================= PUBLIC API =================
+
+    def submit_detection(self, frame, with_scores=False):
+        """
+        Queue face detection for a frame
+
+        Args:
+            frame: BGR frame
+            with_scores: Keep the detector confidence of each face
+
+        Returns:
+            Future resolving to a list of (top, right, bottom, left), or of
+            ((top, right, bottom, left), confidence) with scores
+        """
+        job = _DetectJob(frame, with_scores)
+        self._queue.put(job)
+        return job.future
+
+    def submit_encodings(self, frame, face_locations, exact_cache=False):
+        """
+        Queue face encoding for every face of a frame
+
+        Crops are preprocessed (and looked up in the embedding cache) on
+        the calling thread, only the FaceNet forward pass runs on the
+        server thread.
+
+        Args:
+            frame: BGR frame
+            face_locations: List of (top, right, bottom, left)
+            exact_cache: Only reuse cached embeddings of identical crop hashes
+
+        Returns:
+            Future resolving to a list of encodings aligned with
+            face_locations (None for faces that could not be encoded)
+        """
+        job = _EncodeJob(*self.facenet_service.prepare_faces(frame, face_locations, exact_cache))
+        if len(job.crops) == 0:
+            job.future.set_result(job.encodings)
+        else:
+            self._queue.put(job)
+        return job.future
+
+    def detect_faces(self, frame, timeout=None):
+        """Blocking version of submit_detection (same API as FaceNetService)"""
+        return self.submit_detection(frame).result(timeout)
+
+    def detect_faces_with_scores(self, frame, timeout=None):
+        """Blocking detection with confidences (same API as FaceNetService)"""
+        return self.submit_detection(frame, with_scores=True).result(timeout)
+
+    def get_face_encodings(self, frame, face_locations, exact_cache=False, timeout=None):
+        """Blocking version of submit_encodings (same API as FaceNetService)"""
+        return self.submit_encodings(frame, face_locations, exact_cache).result(timeout)
+
+    def is_ready(self):
+        return self.facenet_service.is_ready()
+
+    def status(self):
+        """Model readiness (see FaceNetService.status)"""
+        return self.facenet_service.status()
+
+    def stats(self):
+        """Batching statistics"""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "faces": self._faces,
+                "avg_batch_size": round(self._faces / self._batches, 2) if self._batches else 0,
+                "detections": self._detections,
+            }
+
+    # ================= WORKER =================
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            detect_jobs, encode_jobs, stopping = self._collect(job)
+
+            for detect_job in detect_jobs:
+                self._run_detection(detect_job)
+            if encode_jobs:
+                self._run_encodings(encode_jobs)
+
+            if stopping:
+                return
+
+    def _collect(self, first_job):
+        """Gather jobs until the batch is full or max_wait_ms has passed"""
+        detect_jobs = []
+        encode_jobs = []
+        crop_count = 0
+        stopping = False
+
+        job = first_job
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while True:
+            if isinstance(job, _DetectJob):
+                detect_jobs.append(job)
+            else:
+                encode_jobs.append(job)
+                crop_count += len(job.crops)
+
+            remaining = deadline - time.monotonic()
+            if crop_count >= self.max_batch_size or remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                stopping = True
+                break
+
+        return detect_jobs, encode_jobs, stopping
+
+    def _run_detection(self, job):
+        if not job.future.set_running_or_notify_cancel():
+            return
+        try:
+            if job.with_scores:
+                job.future.set_result(self.facenet_service.detect_faces_with_scores(job.frame))
+            else:
+                job.future.set_result(self.facenet_service.detect_faces(job.frame))
+            with self._stats_lock:
+                self._detections += 1
+        except Exception as e:
+            job.future.set_exception(e)
+
+    def _run_encodings(self, jobs):
+        jobs = [job for job in jobs if job.future.set_running_or_notify_cancel()]
+        if not jobs:
+            return
+
+        crops = [crop for job in jobs for crop in job.crops]
+        try:
+            # One FaceNet forward pass per max_batch_size crops
+            embeddings = []
+            for offset in range(0, len(crops), self.max_batch_size):
+                batch = np.stack(crops[offset:offset + self.max_batch_size])
+                embeddings.extend(self.facenet_service.embed_faces(batch))
+                with self._stats_lock:
+                    self._batches += 1
+                    self._faces += len(batch)
+        except Exception as e:
+            print(f"[Error] Batch encoding error: {e}")
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+
+        # Split results back to the requests they came from
+        offset = 0
+        for job in jobs:
+            job_embeddings = embeddings[offset:offset + len(job.crops)]
+            offset += len(job.crops)
+            job.future.set_result(self.facenet_service.fill_encodings(
+                job.encodings, job.indexes, job.keys, job_embeddings))
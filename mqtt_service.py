@@ -1,6 +1,9 @@
 import paho.mqtt.client as mqtt
 import time
 import socket, uuid
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 
 class MQTTService:
@@ -11,12 +14,26 @@ class MQTTService:
         username="vund",
         password="131003",
         client_id = f"FaceRec-{socket.gethostname()}-{uuid.uuid4().hex[:6]}",
+        max_workers=4,
+        max_queue_size=100,
+        queue_key=None,
     ):
         self.broker = broker
         self.port = port
         self.client_id = client_id
         self.topic_handlers = {}
 
+        # Handlers run on a worker pool, never on paho's network thread.
+        # Messages with the same queue key (default: topic) run in order,
+        # different keys run in parallel.
+        self.max_queue_size = max_queue_size
+        self.queue_key = queue_key or (lambda topic, payload: topic)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mqtt-handler")
+        self._dispatch_lock = threading.Lock()
+        self._queues = {}  # queue key -> deque of (topic, handler, payload, enqueued_at)
+        self._active_keys = set()
+        self._metrics = {}  # topic -> counters
+
         self.client = mqtt.Client(
             mqtt.CallbackAPIVersion.VERSION1,
             client_id=client_id,
@@ -65,7 +82,64 @@ class MQTTService:
 
         handler = self.topic_handlers.get(msg.topic)
         if handler:
+            self._dispatch(msg.topic, handler, payload)
+
+    # ================= DISPATCH =================
+
+    def _dispatch(self, topic, handler, payload):
+        """Queue a message for its handler (called on paho's network thread)"""
+        key = self.queue_key(topic, payload)
+        with self._dispatch_lock:
+            metrics = self._topic_metrics(topic)
+            queue = self._queues.setdefault(key, deque())
+            if len(queue) >= self.max_queue_size:
+                # Backpressure: never block the network thread, drop instead
+                metrics["dropped"] += 1
+                print(f"MQTT queue {key} full ({len(queue)}) – dropped message on {topic}")
+                return
+            queue.append((topic, handler, payload, time.monotonic()))
+            if key in self._active_keys:
+                return
+            self._active_keys.add(key)
+        self._executor.submit(self._run_next, key)
+
+    def _run_next(self, key):
+        """Run the oldest message of a queue, then reschedule the queue if needed"""
+        with self._dispatch_lock:
+            topic, handler, payload, enqueued_at = self._queues[key].popleft()
+
+        started_at = time.monotonic()
+        try:
             handler(payload)
+            failed = False
+        except Exception as e:
+            failed = True
+            print(f"MQTT handler error on {topic}: {e}")
+        finished_at = time.monotonic()
+
+        with self._dispatch_lock:
+            metrics = self._topic_metrics(topic)
+            metrics["handled"] += 1
+            metrics["errors"] += failed
+            metrics["total_latency"] += finished_at - started_at
+            metrics["max_latency"] = max(metrics["max_latency"], finished_at - started_at)
+            metrics["total_wait"] += started_at - enqueued_at
+
+            # One message per task so a busy queue cannot starve other queues
+            if self._queues[key]:
+                reschedule = True
+            else:
+                del self._queues[key]
+                self._active_keys.discard(key)
+                reschedule = False
+        if reschedule:
+            self._executor.submit(self._run_next, key)
+
+    def _topic_metrics(self, topic):
+        return self._metrics.setdefault(topic, {
+            "handled": 0, "dropped": 0, "errors": 0,
+            "total_latency": 0.0, "max_latency": 0.0, "total_wait": 0.0,
+        })
 
     # ================= PUBLIC API =================
 
@@ -79,6 +153,7 @@ class MQTTService:
         time.sleep(0.2)
         self.client.disconnect()
         self.client.loop_stop()
+        self._executor.shutdown(wait=True)
 
     def subscribe(self, topic, handler):
         self.topic_handlers[topic] = handler
@@ -94,3 +169,23 @@ class MQTTService:
 
     def is_connected(self):
         return self.client.is_connected()
+
+    def stats(self):
+        """Queue depth and handler latency metrics"""
+        with self._dispatch_lock:
+            topics = {}
+            for topic, metrics in self._metrics.items():
+                handled = metrics["handled"] or 1
+                topics[topic] = {
+                    "handled": metrics["handled"],
+                    "dropped": metrics["dropped"],
+                    "errors": metrics["errors"],
+                    "avg_latency_ms": round(metrics["total_latency"] / handled * 1000, 1),
+                    "max_latency_ms": round(metrics["max_latency"] * 1000, 1),
+                    "avg_wait_ms": round(metrics["total_wait"] / handled * 1000, 1),
+                }
+            return {
+                "queue_depth": sum(len(queue) for queue in self._queues.values()),
+                "queues": {key: len(queue) for key, queue in self._queues.items()},
+                "topics": topics,
+            }
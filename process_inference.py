@@ -0,0 +1,378 @@
+"""
+Process Inference - Run FaceNetService in N worker processes
+Each worker owns its own model copy and a fixed number of intra-op threads,
+so detection/embedding run in parallel on several cores instead of sharing
+one GIL. Frames and face crops reach the workers through shared memory,
+only the shapes and the (small) results travel over the pipes.
+
+Workers are forked: create and start the pool before any other thread is
+started and before TensorFlow is imported in the parent process.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from facenet_service import fill_encodings, prepare_faces
+
+EMBEDDING_SIZE = 512
+FACE_CROP_SHAPE = (160, 160, 3)
+
+
+def _worker_main(worker_index, conn, input_name, output_name, intra_op_threads, cpus, service_kwargs):
+    """Worker process: load models, then serve requests until None is received"""
+    # Thread counts must be set before TensorFlow is imported
+    threads = str(intra_op_threads)
+    os.environ["TF_NUM_INTRAOP_THREADS"] = threads
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ["OMP_NUM_THREADS"] = threads
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    try:
+        from facenet_service import FaceNetService
+        try:
+            import tensorflow as tf
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except (ImportError, RuntimeError):
+            pass
+
+        try:
+            service = FaceNetService(**service_kwargs)
+        except Exception as e:
+            conn.send(("failed", str(e)))
+            return
+        conn.send(("ready", service.load_seconds))
+
+        while True:
+            request = conn.recv()
+            if request is None:
+                return
+            op, shape, dtype = request
+            # View on the shared block, no copy
+            data = np.ndarray(shape, dtype=dtype, buffer=input_shm.buf)
+            try:
+                if op == "detect":
+                    conn.send(("ok", service.detect_faces(data)))
+                elif op == "detect_scores":
+                    conn.send(("ok", service.detect_faces_with_scores(data)))
+                elif op == "embed":
+                    embeddings = np.asarray(service.embed_faces(data), dtype=np.float32)
+                    output = np.ndarray(embeddings.shape, dtype=np.float32, buffer=output_shm.buf)
+                    output[:] = embeddings
+                    conn.send(("ok", embeddings.shape))
+                else:
+                    conn.send(("error", f"Unknown operation: {op}"))
+            except Exception as e:
+                conn.send(("error", str(e)))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        input_shm.close()
+        output_shm.close()
+
+
+class _Worker:
+    def __init__(self, index, input_bytes, output_bytes):
+        self.index = index
+        self.input_shm = shared_memory.SharedMemory(create=True, size=input_bytes)
+        self.output_shm = shared_memory.SharedMemory(create=True, size=output_bytes)
+        self.process = None
+        self.conn = None
+        self.state = "pending"
+        self.error = None
+        self.load_seconds = None
+        self.requests = 0
+        self.busy_seconds = 0.0
+
+    def release_memory(self):
+        for shm in (self.input_shm, self.output_shm):
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class ProcessInferenceBackend:
+    def __init__(self, num_workers=2, intra_op_threads=2, pin_cpus=True,
+                 max_batch_size=16, max_frame_shape=(1080, 1920, 3),
+                 request_timeout=30, service_kwargs=None, embedding_cache=None):
+        """
+        Initialize process inference backend (same API as InferenceServer)
+
+        Args:
+            num_workers: Number of worker processes (one model copy each)
+            intra_op_threads: TensorFlow/OpenMP threads per worker
+            pin_cpus: Pin each worker to its own intra_op_threads cores
+            max_batch_size: Maximum number of face crops per FaceNet call
+            max_frame_shape: Largest frame accepted, sizes the shared blocks
+            request_timeout: Max seconds to wait for a free worker
+            service_kwargs: Extra FaceNetService arguments (detector backend, ...)
+            embedding_cache: Optional EmbeddingCache, looked up in this
+                process before crops are sent to a worker
+        """
+        self.num_workers = num_workers
+        self.intra_op_threads = intra_op_threads
+        self.pin_cpus = pin_cpus
+        self.max_batch_size = max_batch_size
+        self.request_timeout = request_timeout
+        self.embedding_cache = embedding_cache
+        self.service_kwargs = dict(service_kwargs or {})
+        self.service_kwargs.setdefault("warmup_batch_size", max_batch_size)
+        self.service_kwargs["lazy"] = False
+
+        frame_bytes = int(np.prod(max_frame_shape))
+        crop_bytes = max_batch_size * int(np.prod(FACE_CROP_SHAPE))
+        self.input_bytes = max(frame_bytes, crop_bytes)
+        self.output_bytes = max_batch_size * EMBEDDING_SIZE * np.dtype(np.float32).itemsize
+
+        self._context = multiprocessing.get_context("fork")
+        self._workers = []
+        self._idle = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._detections = 0
+        self._batches = 0
+        self._faces = 0
+
+    # ================= LIFECYCLE =================
+
+    def start(self):
+        if self._workers:
+            return
+
+        cpu_count = os.cpu_count() or 1
+        for index in range(self.num_workers):
+            worker = _Worker(index, self.input_bytes, self.output_bytes)
+            cpus = None
+            if self.pin_cpus and self.intra_op_threads * self.num_workers <= cpu_count:
+                first = index * self.intra_op_threads
+                cpus = set(range(first, first + self.intra_op_threads))
+
+            parent_conn, child_conn = self._context.Pipe()
+            worker.conn = parent_conn
+            worker.process = self._context.Process(
+                target=_worker_main,
+                args=(index, child_conn, worker.input_shm.name, worker.output_shm.name,
+                      self.intra_op_threads, cpus, self.service_kwargs),
+                name=f"inference-worker-{index}",
+                daemon=True,
+            )
+            worker.state = "loading"
+            self._workers.append(worker)
+
+        # Fork every worker before starting any thread
+        for worker in self._workers:
+            worker.process.start()
+        for worker in self._workers:
+            threading.Thread(target=self._wait_for_worker, args=(worker,),
+                             name=f"inference-worker-{worker.index}-loader", daemon=True).start()
+
+        print(f"Process inference backend started ({self.num_workers} workers x "
+              f"{self.intra_op_threads} threads, max_batch_size={self.max_batch_size})")
+
+    def stop(self, timeout=5):
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+            worker.release_memory()
+        self._workers = []
+        self._ready.clear()
+
+    def _wait_for_worker(self, worker):
+        try:
+            status, value = worker.conn.recv()
+        except EOFError:
+            status, value = "failed", "worker exited during model loading"
+
+        if status == "ready":
+            worker.state = "ready"
+            worker.load_seconds = value
+            self._ready.set()
+            self._idle.put(worker)
+        else:
+            worker.state = "failed"
+            worker.error = value
+            print(f"Inference worker {worker.index} failed to load: {value}")
+
+    # ================= READINESS =================
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def status(self):
+        """Readiness state for /status (ready as soon as one worker is)"""
+        states = [worker.state for worker in self._workers]
+        if "ready" in states:
+            state = "ready"
+        elif "loading" in states:
+            state = "loading"
+        elif states:
+            state = "failed"
+        else:
+            state = "pending"
+        return {
+            "state": state,
+            "load_seconds": max((w.load_seconds for w in self._workers if w.load_seconds), default=None),
+            "error": next((w.error for w in self._workers if w.error), None),
+            "workers": states,
+        }
+
+    # ================= PUBLIC API =================
+
+    def detect_faces(self, frame, timeout=None):
+        """
+        Detect faces in frame on a worker process
+
+        Returns:
+            List of face locations [(top, right, bottom, left), ...]
+        """
+        return self._detect("detect", frame, timeout)
+
+    def detect_faces_with_scores(self, frame, timeout=None):
+        """
+        Detect faces on a worker process, keeping the detector confidence
+
+        Returns:
+            List of ((top, right, bottom, left), confidence)
+        """
+        return self._detect("detect_scores", frame, timeout)
+
+    def embed_faces(self, face_batch, timeout=None):
+        """
+        Run FaceNet on preprocessed faces, split into max_batch_size calls
+
+        Returns:
+            Numpy array of shape (N, 512)
+        """
+        embeddings = []
+        for offset in range(0, len(face_batch), self.max_batch_size):
+            batch = np.ascontiguousarray(face_batch[offset:offset + self.max_batch_size], dtype=np.uint8)
+            embeddings.append(self._call("embed", batch, timeout))
+            with self._stats_lock:
+                self._batches += 1
+                self._faces += len(batch)
+        return np.concatenate(embeddings) if embeddings else np.empty((0, EMBEDDING_SIZE), np.float32)
+
+    def get_face_encodings(self, frame, face_locations, exact_cache=False, timeout=None):
+        """
+        Get encodings of all faces in a frame (same API as FaceNetService)
+
+        Crops are preprocessed (and looked up in the embedding cache) on
+        the calling thread, only the FaceNet forward pass runs on a worker.
+        exact_cache only reuses cached embeddings of identical crop hashes.
+
+        Returns:
+            List of encodings aligned with face_locations (None for faces
+            that could not be encoded)
+        """
+        encodings, crops, indexes, keys = prepare_faces(frame, face_locations, self.embedding_cache,
+                                                        exact_cache)
+        if crops:
+            fill_encodings(encodings, indexes, keys, self.embed_faces(np.stack(crops), timeout),
+                           self.embedding_cache)
+        return encodings
+
+    def submit_detection(self, frame, with_scores=False):
+        """Run detection on a worker from a short-lived thread, returns a Future"""
+        return self._submit(self.detect_faces_with_scores if with_scores else self.detect_faces, frame)
+
+    def submit_encodings(self, frame, face_locations, exact_cache=False):
+        """Run encoding on a worker from a short-lived thread, returns a Future"""
+        return self._submit(self.get_face_encodings, frame, face_locations, exact_cache)
+
+    def stats(self):
+        """Per-worker and total statistics"""
+        with self._stats_lock:
+            return {
+                "backend": "process",
+                "idle_workers": self._idle.qsize(),
+                "detections": self._detections,
+                "batches": self._batches,
+                "faces": self._faces,
+                "avg_batch_size": round(self._faces / self._batches, 2) if self._batches else 0,
+                "workers": [{
+                    "state": worker.state,
+                    "alive": worker.process.is_alive() if worker.process else False,
+                    "requests": worker.requests,
+                    "busy_seconds": round(worker.busy_seconds, 2),
+                } for worker in self._workers],
+            }
+
+    # ================= WORKERS =================
+
+    def _detect(self, op, frame, timeout):
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.input_bytes:
+            raise ValueError(f"Frame {frame.shape} is larger than the shared frame buffer")
+
+        result = self._call(op, frame, timeout)
+        with self._stats_lock:
+            self._detections += 1
+        return result
+
+    def _submit(self, function, *args):
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def _call(self, op, data, timeout=None):
+        """Copy data into a free worker's shared block and run op there"""
+        timeout = self.request_timeout if timeout is None else timeout
+        if self.status()["state"] == "failed":
+            # Every worker failed: do not wait for one that will never come
+            raise RuntimeError(f"Inference workers failed to load: {self.status()['error']}")
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError(f"No inference worker available (status={self.status()['state']})")
+
+        started_at = time.monotonic()
+        try:
+            np.ndarray(data.shape, dtype=data.dtype, buffer=worker.input_shm.buf)[:] = data
+            worker.conn.send((op, data.shape, data.dtype.str))
+            status, value = worker.conn.recv()
+        except (EOFError, BrokenPipeError, OSError) as e:
+            # Worker died: keep it out of the idle queue
+            worker.state = "failed"
+            worker.error = f"worker exited: {e}"
+            print(f"Inference worker {worker.index} exited: {e}")
+            raise RuntimeError(worker.error)
+
+        worker.requests += 1
+        worker.busy_seconds += time.monotonic() - started_at
+        try:
+            if status != "ok":
+                raise RuntimeError(value)
+            if op == "embed":
+                # Copy out before the worker is reused
+                return np.ndarray(value, dtype=np.float32, buffer=worker.output_shm.buf).copy()
+            return value
+        finally:
+            self._idle.put(worker)
@@ -1,5 +1,9 @@
 import redis
-from typing import Any, Optional
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+from redis.retry import Retry
 
 
 class RedisService:
@@ -17,17 +21,47 @@ class RedisService:
         db: int = 0,
         password: Optional[str] = None,
         decode_responses: bool = True,
+        max_connections: int = 20,
+        pool_timeout: float = 5.0,
+        socket_timeout: float = 5.0,
+        socket_connect_timeout: float = 3.0,
+        retries: int = 3,
+        backoff_base: float = 0.05,
+        backoff_cap: float = 1.0,
     ):
         if hasattr(self, "_initialized"):
             return
 
-        self.client = redis.Redis(
+        connection_kwargs = dict(
             host=host,
             port=port,
             db=db,
             password=password,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_connect_timeout,
+            # retry lỗi mạng / timeout với exponential backoff
+            retry=Retry(ExponentialBackoff(cap=backoff_cap, base=backoff_base), retries),
+            retry_on_error=[ConnectionError, TimeoutError],
+            health_check_interval=30,
+        )
+
+        # pool giới hạn số connection, chờ tối đa pool_timeout khi hết connection
+        self.pool = redis.BlockingConnectionPool(
+            max_connections=max_connections,
+            timeout=pool_timeout,
             decode_responses=decode_responses,
+            **connection_kwargs,
+        )
+        self.client = redis.Redis(connection_pool=self.pool)
+
+        # client không decode, dùng cho dữ liệu nhị phân (embedding float32)
+        self.raw_pool = redis.BlockingConnectionPool(
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            decode_responses=False,
+            **connection_kwargs,
         )
+        self.raw_client = redis.Redis(connection_pool=self.raw_pool)
 
         # test connection
         self.client.ping()
@@ -47,6 +81,64 @@ class RedisService:
     def exists(self, key: str) -> bool:
         return self.client.exists(key) == 1
 
+    def rename(self, key: str, new_key: str):
+        return self.client.rename(key, new_key)
+
+    # ---------- BATCH ----------
+    def mget(self, keys: List[str]) -> list:
+        """Get many keys in one round trip"""
+        return self.client.mget(keys)
+
+    def mset(self, mapping: Dict[str, Any]):
+        """Set many keys in one round trip"""
+        return self.client.mset(mapping)
+
+    def scan_iter(self, match: Optional[str] = None, count: int = 1000) -> Iterator[str]:
+        """Iterate keys matching a pattern (SCAN, non-blocking for the server)"""
+        return self.client.scan_iter(match=match, count=count)
+
+    def get_many(self, match: str, count: int = 1000) -> Dict[str, Any]:
+        """Bulk read of every key matching a pattern: SCAN + one MGET per batch"""
+        result = {}
+        batch = []
+        for key in self.client.scan_iter(match=match, count=count):
+            batch.append(key)
+            if len(batch) >= count:
+                result.update(zip(batch, self.client.mget(batch)))
+                batch = []
+        if batch:
+            result.update(zip(batch, self.client.mget(batch)))
+        return result
+
+    def hgetall_many(self, names: Iterable[str]) -> Dict[str, dict]:
+        """HGETALL of several hashes in one round trip"""
+        names = list(names)
+        with self.pipeline() as pipe:
+            for name in names:
+                pipe.hgetall(name)
+            return dict(zip(names, pipe.execute()))
+
+    # ---------- PIPELINE ----------
+    @contextmanager
+    def pipeline(self, transaction: bool = False, raw: bool = False):
+        """
+        Queue commands and send them in one round trip
+
+        Commands still queued when the block exits are executed then; call
+        pipe.execute() inside the block to get the results.
+
+        Args:
+            transaction: Wrap the commands in MULTI/EXEC
+            raw: Use the binary (non-decoding) client
+        """
+        pipe = (self.raw_client if raw else self.client).pipeline(transaction=transaction)
+        try:
+            yield pipe
+            if len(pipe):
+                pipe.execute()
+        finally:
+            pipe.reset()
+
     # ---------- HASH ----------
     def hset(self, name: str, mapping: dict):
         return self.client.hset(name, mapping=mapping)
@@ -54,6 +146,25 @@ class RedisService:
     def hgetall(self, name: str) -> dict:
         return self.client.hgetall(name)
 
+    def hget(self, name: str, key: str):
+        return self.client.hget(name, key)
+
+    def hmget(self, name: str, keys: List[str]) -> list:
+        """Get several fields of a hash in one round trip"""
+        return self.client.hmget(name, keys)
+
+    def hdel(self, name: str, *keys):
+        return self.client.hdel(name, *keys)
+
+    # ---------- BINARY HASH ----------
+    def hset_bytes(self, name: str, mapping: dict):
+        """HSET with raw bytes values"""
+        return self.raw_client.hset(name, mapping=mapping)
+
+    def hscan_bytes(self, name: str, count: int = 1000):
+        """Iterate (field, value) of a hash as raw bytes, in HSCAN batches"""
+        return self.raw_client.hscan_iter(name, count=count)
+
     # ---------- LIST / QUEUE ----------
     def lpush(self, key: str, value: Any):
         return self.client.lpush(key, value)
@@ -71,6 +182,15 @@ class RedisService:
     def smembers(self, key: str):
         return self.client.smembers(key)
 
+    # ---------- SORTED SET ----------
+    def zcard(self, key: str) -> int:
+        return self.client.zcard(key)
+
+    # ---------- SCRIPT ----------
+    def register_script(self, script: str):
+        """Lua script callable as script(keys=[...], args=[...]) (EVALSHA, atomic)"""
+        return self.client.register_script(script)
+
     # ---------- PUB / SUB ----------
     def publish(self, channel: str, message: str):
         return self.client.publish(channel, message)
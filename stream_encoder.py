@@ -0,0 +1,209 @@
+"""
+Stream Encoder - One JPEG encode per frame for every MJPEG viewer
+A background thread annotates, scales and encodes the newest camera frame
+at most max_fps times per second, and every viewer is sent the same
+ready-made multipart chunk. Encoding only runs while someone is watching.
+
+With a pass-through camera (MJPEGCameraReader) frames with nothing to draw
+are forwarded as the camera's original JPEG bytes: no decode, no encode.
+"""
+import threading
+import time
+
+import cv2
+
+BOUNDARY = b"frame"
+
+
+class StreamEncoder:
+    def __init__(self, camera_reader, annotate=None, has_overlay=None, quality=80, scale=1.0,
+                 max_fps=15, passthrough=True, frame_timeout=5):
+        """
+        Initialize encoder
+
+        Args:
+            camera_reader: CameraReader providing frames
+            annotate: Optional callback (frame, scale) drawing on the frame in place
+            has_overlay: Optional callback returning False when annotate would
+                draw nothing (frame can then be passed through)
+            quality: JPEG quality (0-100)
+            scale: Output scale factor relative to the camera resolution
+                (0.5 = half resolution)
+            max_fps: Maximum encoded frames per second
+            passthrough: Forward original JPEG bytes when nothing is drawn and
+                scale is 1.0 (needs a reader with supports_jpeg)
+            frame_timeout: Max seconds to wait for a camera frame
+        """
+        self.camera_reader = camera_reader
+        self.annotate = annotate
+        self.has_overlay = has_overlay
+        self.passthrough = passthrough
+        self.quality = quality
+        self.scale = scale
+        self.max_fps = max_fps
+        self.frame_timeout = frame_timeout
+
+        # Latest (seq, chunk), replaced as a whole
+        self._chunk = None
+        self._seq = 0
+        self._viewers = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self._encoded = 0
+        self._passed_through = 0
+        self._encode_seconds = 0.0
+        self._bytes = 0
+
+    # ================= LIFECYCLE =================
+
+    def start(self):
+        """Start the encoder thread (no-op if already running)"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="stream-encoder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ================= PUBLIC API =================
+
+    def frames(self):
+        """
+        Generator of multipart chunks for one viewer (Flask Response body)
+
+        Chunks are shared bytes objects, never copied per viewer.
+        """
+        with self._condition:
+            self._viewers += 1
+            self._condition.notify_all()
+        try:
+            last_seq = 0
+            while True:
+                latest = self.wait_for_chunk(last_seq, timeout=self.frame_timeout)
+                if latest is None:
+                    print("[Warning] No frame from camera — waiting...")
+                    continue
+                last_seq, chunk = latest
+                yield chunk
+        finally:
+            with self._condition:
+                self._viewers -= 1
+
+    def wait_for_chunk(self, after_seq=0, timeout=None):
+        """
+        Block until a chunk newer than after_seq is available
+
+        Returns:
+            Tuple (seq, chunk) or None on timeout / stop
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: not self._running or self._seq > after_seq, timeout)
+            if self._seq > after_seq:
+                return self._seq, self._chunk
+            return None
+
+    def stats(self):
+        with self._condition:
+            return {
+                "viewers": self._viewers,
+                "quality": self.quality,
+                "scale": self.scale,
+                "max_fps": self.max_fps,
+                "encoded_frames": self._encoded,
+                "passthrough_frames": self._passed_through,
+                "avg_encode_ms": round(self._encode_seconds * 1000 / self._encoded, 2) if self._encoded else 0,
+                "avg_frame_kb": round(self._bytes / self._encoded / 1024, 1) if self._encoded else 0,
+            }
+
+    # ================= WORKER =================
+
+    def _run(self):
+        last_seq = 0
+        next_frame_at = 0.0
+        while True:
+            with self._condition:
+                # Sleep while nobody is watching
+                self._condition.wait_for(lambda: not self._running or self._viewers > 0)
+                if not self._running:
+                    return
+
+            delay = next_frame_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            passthrough = self._use_passthrough()
+            if passthrough:
+                latest = self.camera_reader.wait_for_jpeg(last_seq, timeout=self.frame_timeout)
+            else:
+                latest = self.camera_reader.wait_for_frame(last_seq, timeout=self.frame_timeout)
+            if latest is None:
+                continue
+            last_seq, _, image = latest
+            next_frame_at = time.monotonic() + 1.0 / self.max_fps if self.max_fps else 0.0
+
+            if passthrough:
+                # Original camera JPEG, untouched
+                with self._condition:
+                    self._publish(multipart_chunk(image))
+                    self._passed_through += 1
+                continue
+
+            try:
+                started_at = time.perf_counter()
+                chunk = self._encode(image)
+                elapsed = time.perf_counter() - started_at
+            except Exception as e:
+                print(f"[Error] Stream encoding error: {e}")
+                continue
+
+            with self._condition:
+                self._publish(chunk)
+                self._encoded += 1
+                self._encode_seconds += elapsed
+                self._bytes += len(chunk)
+
+    def _publish(self, chunk):
+        self._seq += 1
+        self._chunk = chunk
+        self._condition.notify_all()
+
+    def _use_passthrough(self):
+        if not self.passthrough or self.scale != 1.0 or not self.camera_reader.supports_jpeg:
+            return False
+        if self.annotate is None:
+            return True
+        return self.has_overlay is not None and not self.has_overlay()
+
+    def _encode(self, frame):
+        # Decoded frames may be smaller than the camera resolution (scaled decoding)
+        scale = self.scale / self.camera_reader.frame_scale
+
+        # Frame is shared with other consumers: resize / copy before drawing
+        if scale != 1.0:
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+            frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=interpolation)
+        else:
+            frame = frame.copy()
+        if self.annotate is not None:
+            self.annotate(frame, scale)
+
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return multipart_chunk(jpeg.data)
+
+
+def multipart_chunk(jpeg):
+    """One multipart/x-mixed-replace part, built with a single copy of the JPEG bytes"""
+    header = b"--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % (BOUNDARY, len(jpeg))
+    return b"".join((header, jpeg, b"\r\n"))
@@ -0,0 +1,200 @@
+"""
+Stream Pipeline - Background face analysis for a camera
+Detects faces every K frames (or when a track is lost), tracks boxes in
+between and caches one identity per track. An optional detection gate
+skips detection while the scene is unchanged and limits it to a region of
+interest. Viewers draw the latest tracks on every frame, so the stream
+frame rate does not depend on model cost. Analysis only runs while someone
+is watching.
+"""
+import threading
+import time
+
+import cv2
+
+from face_tracker import FaceTracker
+
+
+class StreamPipeline:
+    def __init__(self, camera_reader, inference_server, identify_faces,
+                 tracking=True, detect_every=10, frame_timeout=5, gate=None):
+        """
+        Initialize pipeline
+
+        Args:
+            camera_reader: CameraReader providing frames
+            inference_server: InferenceServer (or FaceNetService) for detection/encoding
+            identify_faces: Callback (frame, face_locations, face_encodings) -> list of user_ids
+            tracking: If False, detect and identify every frame (no identity cache)
+            detect_every: Run detection every K frames when tracking
+            frame_timeout: Max seconds to wait for a camera frame
+            gate: Optional DetectionGate (motion check + region of interest)
+        """
+        self.camera_reader = camera_reader
+        self.inference_server = inference_server
+        self.identify_faces = identify_faces
+        self.tracking = tracking
+        self.detect_every = detect_every
+        self.frame_timeout = frame_timeout
+        self.gate = gate
+
+        self.tracker = FaceTracker()
+        self._frames_since_detection = 0
+
+        # Latest [(box, user_id), ...], replaced as a whole so readers need no lock
+        self._snapshot = []
+
+        self._viewers = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self._frames = 0
+        self._detections = 0
+        self._encodings = 0
+
+    # ================= LIFECYCLE =================
+
+    def start(self):
+        """Start the analysis thread (no-op if already running)"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="stream-pipeline", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ================= PUBLIC API =================
+
+    def add_viewer(self):
+        """Count a viewer of the annotated stream (analysis resumes)"""
+        with self._condition:
+            self._viewers += 1
+            self._condition.notify_all()
+
+    def remove_viewer(self):
+        """Drop a viewer; analysis pauses when the last one leaves"""
+        with self._condition:
+            self._viewers -= 1
+
+    def tracks(self):
+        """Latest tracked faces as a list of (box, user_id)"""
+        return self._snapshot
+
+    def annotate(self, frame, scale=1.0):
+        """
+        Draw bounding box + ID of the latest tracks on frame (in place)
+
+        Args:
+            frame: Frame to draw on
+            scale: Size of frame relative to the camera frame (boxes are scaled)
+        """
+        for box, user_id in self._snapshot:
+            top, right, bottom, left = (int(value * scale) for value in box)
+            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+            label = f"ID {user_id}" if user_id is not None else "..."
+            cv2.putText(frame, label, (left, top - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8 * max(scale, 0.5), (255, 255, 255), 2)
+        return frame
+
+    def stats(self):
+        return {
+            "viewers": self._viewers,
+            "tracking": self.tracking,
+            "frames": self._frames,
+            "detections": self._detections,
+            "encodings": self._encodings,
+            "tracks": len(self._snapshot),
+            "gate": self.gate.stats() if self.gate else None,
+        }
+
+    # ================= WORKER =================
+
+    def _run(self):
+        last_seq = 0
+        while True:
+            with self._condition:
+                if self._viewers == 0:
+                    # Nobody is watching: drop the tracks, they are stale on resume
+                    self.tracker.clear()
+                    self._frames_since_detection = 0
+                    self._snapshot = []
+                # Sleep while nobody is watching
+                self._condition.wait_for(lambda: not self._running or self._viewers > 0)
+                if not self._running:
+                    return
+
+            latest = self.camera_reader.wait_for_frame(last_seq, timeout=self.frame_timeout)
+            if latest is None:
+                continue
+            last_seq, _, frame = latest
+
+            # Ensure frame is valid
+            if frame.ndim != 3 or frame.shape[2] != 3:
+                print("[Warning] Invalid frame format")
+                continue
+
+            try:
+                self._process(frame)
+            except Exception as e:
+                print(f"[Error] Stream analysis error: {e}")
+
+            if self.gate is not None and self.gate.idle and not self._snapshot:
+                # Empty, static scene: look at a few frames per second only
+                time.sleep(self.gate.idle_interval)
+
+    def _process(self, frame):
+        self._frames += 1
+        if self.gate is not None:
+            self.gate.update(frame)
+
+        if not self.tracking:
+            # No identity cache: every frame is detected and identified from scratch
+            self.tracker.clear()
+            detect = True
+        else:
+            detect = (self._frames_since_detection + 1 >= self.detect_every
+                      or not self.tracker.tracks
+                      or self.tracker.has_lost_tracks())
+
+        if detect and self.gate is not None and not self.gate.should_detect():
+            # Nothing moved since the last detection: its result still holds
+            self._frames_since_detection = 0
+            if not self.tracking:
+                return
+            detect = False
+
+        if detect:
+            self._frames_since_detection = 0
+            self._detections += 1
+            if self.gate is not None:
+                face_locations = self.gate.detect(frame, self.inference_server.detect_faces)
+            else:
+                face_locations = self.inference_server.detect_faces(frame)
+            tracks = self.tracker.update(frame, face_locations)
+            self._identify(frame, [track for track in tracks if track.user_id is None])
+        else:
+            self._frames_since_detection += 1
+            tracks = self.tracker.propagate(frame)
+
+        self._snapshot = [(track.box, track.user_id) for track in tracks]
+
+    def _identify(self, frame, tracks):
+        """Embed and match only tracks without a cached identity"""
+        if not tracks:
+            return
+        face_locations = [track.box for track in tracks]
+        face_encodings = self.inference_server.get_face_encodings(frame, face_locations)
+        self._encodings += sum(encoding is not None for encoding in face_encodings)
+
+        user_ids = self.identify_faces(frame, face_locations, face_encodings)
+        for track, user_id in zip(tracks, user_ids):
+            track.user_id = user_id
@@ -0,0 +1,216 @@
+"""
+Tests for the copy-on-write face index backends and the gallery id allocator
+Run with: python -m pytest -q test_face_index.py
+"""
+import random
+
+import numpy as np
+import pytest
+
+from face_gallery import FaceGallery, IdAllocator, normalize_encodings
+from face_index import FlatIndex, IVFIndex
+
+DIMENSION = 8
+
+INDEXES = {
+    # Small capacity so removals trigger compaction
+    "flat": lambda: FlatIndex(DIMENSION, initial_capacity=4),
+    # Low threshold so the inverted lists are used, nprobe covers every list
+    "ivf": lambda: IVFIndex(DIMENSION, train_threshold=30, nprobe=100),
+}
+
+
+def random_encodings(count, seed=0):
+    return normalize_encodings(np.random.default_rng(seed).normal(size=(count, DIMENSION)))
+
+
+def contents(index):
+    """user_id -> encoding of an index version"""
+    return {user_id: encoding.copy() for user_id, encoding in zip(index.ids, index.encodings)}
+
+
+def assert_matches(index, model):
+    assert len(index) == len(model)
+    assert sorted(index.ids) == sorted(model)
+    for user_id, encoding in zip(index.ids, index.encodings):
+        np.testing.assert_allclose(encoding, model[user_id])
+    for user_id in range(200):
+        assert (user_id in index) == (user_id in model)
+
+
+# ================= ID ALLOCATION =================
+
+def test_allocator_hands_out_smallest_free_id():
+    allocator = IdAllocator()
+    assert [allocator.allocate() for _ in range(3)] == [0, 1, 2]
+    allocator.release(1)
+    allocator.release(0)
+    assert allocator.next_id == 0
+    assert [allocator.allocate() for _ in range(3)] == [0, 1, 3]
+
+
+def test_allocator_skips_reserved_ids():
+    allocator = IdAllocator()
+    allocator.reserve(1)
+    allocator.reserve(2)
+    assert [allocator.allocate() for _ in range(2)] == [0, 3]
+    allocator.release(2)
+    assert allocator.allocate() == 2
+
+
+def test_gallery_fills_gaps_after_load():
+    gallery = FaceGallery(dimension=DIMENSION)
+    gallery.load([0, 2, 5], random_encodings(3))
+    assert gallery.next_id == 1
+
+    # Orthogonal-ish new faces never match the loaded ones
+    new_ids = [gallery.enroll(encoding, tolerance=0.01)[0] for encoding in random_encodings(4, seed=1)]
+    assert new_ids == [1, 3, 4, 6]
+
+    assert gallery.remove(2)
+    assert gallery.next_id == 2
+
+
+def test_gallery_releases_id_after_remove_callback():
+    gallery = FaceGallery(dimension=DIMENSION)
+    user_id, _ = gallery.enroll(random_encodings(1)[0])
+    seen = []
+    assert gallery.remove(user_id, on_removed=lambda removed: seen.append((removed, gallery.next_id)))
+    # Callback ran before the id was handed back
+    assert seen == [(user_id, user_id + 1)]
+    assert gallery.next_id == user_id
+
+
+# ================= COPY-ON-WRITE SNAPSHOTS =================
+
+@pytest.mark.parametrize("backend", INDEXES)
+def test_snapshot_unchanged_by_remove_and_readd(backend):
+    index = INDEXES[backend]()
+    encodings = random_encodings(10)
+    index.add_many(list(range(10)), encodings)
+    snapshot = index
+    expected = contents(snapshot)
+
+    index = index.copy()
+    assert index.remove(3)
+    index.add(3, random_encodings(1, seed=5)[0])
+    assert index.remove(7)
+
+    assert_matches(snapshot, expected)
+    assert 7 not in index and 7 in snapshot
+    assert not np.allclose(contents(index)[3], expected[3])
+
+
+@pytest.mark.parametrize("backend", INDEXES)
+def test_snapshot_unchanged_by_compaction(backend):
+    index = INDEXES[backend]()
+    index.add_many(list(range(40)), random_encodings(40))
+    snapshots = [(index, contents(index))]
+
+    # Remove most rows one version at a time: the flat buffer gets compacted
+    for user_id in range(35):
+        index = index.copy()
+        assert index.remove(user_id)
+        snapshots.append((index, contents(index)))
+
+    assert len(index) == 5
+    for snapshot, expected in snapshots:
+        assert_matches(snapshot, expected)
+
+
+@pytest.mark.parametrize("backend", INDEXES)
+def test_writing_an_old_snapshot_leaves_newer_versions_alone(backend):
+    index = INDEXES[backend]()
+    index.add_many(list(range(10)), random_encodings(10))
+    old = index
+    new = index.copy()
+    new.remove(1)
+    new_expected = contents(new)
+
+    branch = old.copy()
+    branch.remove(2)
+    branch.add(50, random_encodings(1, seed=9)[0])
+
+    assert_matches(new, new_expected)
+    assert 1 in branch and 2 not in branch and 50 in branch
+    assert 50 not in new and 2 in new
+
+
+@pytest.mark.parametrize("backend", INDEXES)
+def test_random_versions_stay_consistent(backend):
+    rng = np.random.default_rng(1)
+    randomizer = random.Random(1)
+    versions = [(INDEXES[backend](), {})]
+    for _ in range(400):
+        # Mostly extend the newest version, sometimes branch from an old one
+        if randomizer.random() < 0.85:
+            index, model = versions[-1]
+        else:
+            index, model = randomizer.choice(versions)
+        index, model = index.copy(), dict(model)
+        for _ in range(randomizer.randint(1, 3)):
+            if model and randomizer.random() < 0.45:
+                user_id = randomizer.choice(list(model))
+                assert index.remove(user_id)
+                del model[user_id]
+            else:
+                user_id = randomizer.randrange(200)
+                if user_id in model:
+                    index.remove(user_id)
+                encoding = normalize_encodings(rng.normal(size=DIMENSION))
+                index.add(user_id, encoding)
+                model[user_id] = encoding
+        versions.append((index, model))
+
+    for index, model in versions:
+        assert_matches(index, model)
+
+
+# ================= SEARCH =================
+
+@pytest.mark.parametrize("backend", INDEXES)
+def test_search_skips_removed_rows(backend):
+    index = INDEXES[backend]()
+    encodings = random_encodings(40)
+    index.add_many(list(range(40)), encodings)
+    snapshot = index
+
+    index = index.copy()
+    index.remove(4)
+    probe = encodings[4]
+
+    _, ids = index.search(probe[None], k=len(index))
+    assert 4 not in ids[0]
+    assert len(ids[0]) == len(index)
+    assert all(user_id != 4 for user_id, _ in index.range_search(probe, 2.0))
+
+    # The old version still finds the removed user first
+    _, ids = snapshot.search(probe[None], k=1)
+    assert ids[0] == [4]
+    assert snapshot.range_search(probe, 1e-4)[0][0] == 4
+
+
+def test_flat_search_with_only_removed_rows():
+    index = FlatIndex(DIMENSION)
+    encodings = random_encodings(3)
+    index.add_many([0, 1, 2], encodings)
+    for user_id in (0, 1, 2):
+        index.remove(user_id)
+
+    distances, ids = index.search(encodings[:1], k=2)
+    assert ids == [[]]
+    assert np.isinf(distances).all()
+    assert index.range_search(encodings[0], 2.0) == []
+
+
+def test_payload_follows_row():
+    index = FlatIndex(DIMENSION, initial_capacity=2)
+    index.add_many([0, 1, 2], random_encodings(3), ["a", "b", "c"])
+    snapshot = index
+    index = index.copy()
+    index.remove(1)
+    index.add(1, random_encodings(1, seed=3)[0], "B")
+
+    assert index.payload(1) == "B"
+    assert snapshot.payload(1) == "b"
+    assert sorted(index.payloads) == ["B", "a", "c"]